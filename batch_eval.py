@@ -0,0 +1,40 @@
+import numpy as np
+import chess
+from board_rep import PIECE_ORDER, board_bitboards
+
+class PSTBatchEvaluator:
+    """
+    The material, piece-square and endgame pawn terms of v3's evaluate_board for many positions in one call.
+    Every (bitboard, square) pair gets a fixed score, so a batch is one unpackbits and one matrix-vector product
+    over the stacked bitboards of board_rep.board_bitboards.
+    """
+    def __init__(self, piece_square_table, piece_values, endgame_pieces=10):
+        self.endgame_pieces = endgame_pieces
+        scores = np.zeros((2, 6, 64))
+        pawn_bonus = np.zeros((2, 6, 64))
+        for plane, piece_type in enumerate(PIECE_ORDER):
+            for square in range(64):
+                # Same table lookup as evaluate_board, which uses table[square // 8][square % 8] for both colors
+                score = piece_values[piece_type] + piece_square_table[piece_type][square // 8][square % 8]
+                scores[0, plane, square] = score
+                scores[1, plane, square] = -score
+        rank = np.arange(64) // 8
+        pawn_bonus[0, PIECE_ORDER.index(chess.PAWN)] = rank * 10
+        pawn_bonus[1, PIECE_ORDER.index(chess.PAWN)] = -(7 - rank) * 10
+        self.scores = scores.reshape(-1).astype(np.float32)
+        self.pawn_bonus = pawn_bonus.reshape(-1).astype(np.float32)
+
+    def __call__(self, bitboards):
+        """(N, 12) bitboards -> (N,) evaluations from White's point of view."""
+        bitboards = np.ascontiguousarray(bitboards, dtype='<u8')
+        bits = np.unpackbits(bitboards.view(np.uint8), axis=-1, bitorder='little').reshape(len(bitboards), 12 * 64)
+        bits = bits.astype(np.float32)
+        values = bits @ self.scores
+        endgame = bits.sum(axis=1) <= self.endgame_pieces
+        values[endgame] += bits[endgame] @ self.pawn_bonus
+        return values
+
+    def evaluate_boards(self, boards):
+        if not boards:
+            return np.zeros(0, dtype=np.float32)
+        return self(np.stack([board_bitboards(board) for board in boards]))
@@ -0,0 +1,333 @@
+"""
+Small endgame bitbases (KQK, KRK, KPK, KBNK) built by retrograde analysis with NumPy.
+
+Run `python bitbase.py` once to write the tables into `bitbases/`; the engines memory-map them at startup.
+Each table is a (2, 64 ** n) uint8 array indexed by [side to move][white king, black king, white pieces...],
+always with White as the strong side (Black-strong positions are mirrored before probing).
+A value of 0 means draw (or an illegal position), otherwise the position is decided in value - 1 plies:
+won for White when White is to move, lost for Black when Black is to move.
+"""
+import os
+import sys
+import time
+import numpy as np
+import chess
+
+TABLES = {
+    'KQK': [chess.QUEEN],
+    'KRK': [chess.ROOK],
+    'KPK': [chess.PAWN],
+    'KBNK': [chess.BISHOP, chess.KNIGHT],
+}
+# KPK promotes into these, so they have to be generated first
+PROMOTION_TABLES = {chess.QUEEN: 'KQK', chess.ROOK: 'KRK'}
+
+ROOK_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+SLIDER_DIRECTIONS = {
+    chess.BISHOP: BISHOP_DIRECTIONS,
+    chess.ROOK: ROOK_DIRECTIONS,
+    chess.QUEEN: ROOK_DIRECTIONS + BISHOP_DIRECTIONS,
+}
+
+def _step_table(offsets):
+    table = np.zeros(64, dtype=np.uint64)
+    for square in range(64):
+        file, rank = chess.square_file(square), chess.square_rank(square)
+        for df, dr in offsets:
+            if 0 <= file + df < 8 and 0 <= rank + dr < 8:
+                table[square] |= np.uint64(1 << chess.square(file + df, rank + dr))
+    return table
+
+KING_ATTACKS = _step_table([(df, dr) for df in (-1, 0, 1) for dr in (-1, 0, 1) if df or dr])
+KNIGHT_ATTACKS = _step_table([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+PAWN_ATTACKS = _step_table([(-1, 1), (1, 1)])
+STEP_ATTACKS = {chess.KING: KING_ATTACKS, chess.KNIGHT: KNIGHT_ATTACKS}
+
+def _ray_table(directions):
+    # rays[d, square, step] is the square `step + 1` steps away in direction d, or -1 off the board
+    rays = np.full((len(directions), 64, 7), -1, dtype=np.int64)
+    for d, (df, dr) in enumerate(directions):
+        for square in range(64):
+            file, rank = chess.square_file(square), chess.square_rank(square)
+            for step in range(7):
+                file, rank = file + df, rank + dr
+                if not (0 <= file < 8 and 0 <= rank < 8):
+                    break
+                rays[d, square, step] = chess.square(file, rank)
+    return rays
+
+RAYS = {piece_type: _ray_table(directions) for piece_type, directions in SLIDER_DIRECTIONS.items()}
+
+BIT = np.array([1 << square for square in range(64)], dtype=np.uint64)
+BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def _popcount(bitboards):
+    return BYTE_POPCOUNT[bitboards.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.uint8)
+
+class _Layout:
+    """Index arithmetic for one table: squares are (white king, black king, *white pieces)."""
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.count = 2 + len(pieces)
+        self.size = 64 ** self.count
+
+    def decode(self, index):
+        index = index % self.size
+        return [(index >> (6 * (self.count - 1 - i))) & 63 for i in range(self.count)]
+
+    def encode(self, squares):
+        index = np.zeros(len(squares[0]), dtype=np.int64)
+        for square in squares:
+            index = (index << 6) | square
+        return index
+
+def _occupied_by(square, squares):
+    hit = np.zeros(len(square), dtype=np.bool_)
+    for other in squares:
+        hit |= square == other
+    return hit
+
+def _piece_moves(piece_type, square, blockers, backwards=False):
+    """
+    Yields (target square, valid mask) for every pseudo-move of a white piece, vectorized over positions.
+    `blockers` are the other occupied squares. With backwards=True pawn pushes are generated in reverse.
+    """
+    if piece_type == chess.PAWN:
+        step = -8 if backwards else 8
+        one = square + step
+        ok = (one >= 8) & (one < 56) if backwards else (one < 64)
+        one = np.where(ok, one, 0)
+        ok &= ~_occupied_by(one, blockers)
+        yield one, ok
+        start_rank = 3 if backwards else 1
+        two = np.where(ok, square + 2 * step, 0)
+        yield two, ok & (square >> 3 == start_rank) & ~_occupied_by(two, blockers)
+    elif piece_type in STEP_ATTACKS:
+        table = STEP_ATTACKS[piece_type]
+        for target in range(64):
+            ok = (table[square] & BIT[target]) != 0
+            ok &= ~_occupied_by(np.full(len(square), target), blockers)
+            yield np.full(len(square), target), ok
+    else:
+        rays = RAYS[piece_type]
+        for d in range(len(rays)):
+            open_ray = np.ones(len(square), dtype=np.bool_)
+            for step in range(7):
+                target = rays[d, square, step]
+                open_ray &= target >= 0
+                target = np.where(open_ray, target, 0)
+                open_ray &= ~_occupied_by(target, blockers)
+                yield target, open_ray.copy()
+
+def _white_attacks(piece_types, squares):
+    # Attacks of all white pieces with the black king removed, so squares behind it stay attacked
+    attacks = KING_ATTACKS[squares[0]].copy()
+    white = [squares[0]] + squares[2:]
+    for i, piece_type in enumerate(piece_types):
+        square = squares[2 + i]
+        if piece_type == chess.PAWN:
+            attacks |= PAWN_ATTACKS[square]
+        elif piece_type == chess.KNIGHT:
+            attacks |= KNIGHT_ATTACKS[square]
+        else:
+            others = [s for j, s in enumerate(white) if j != i + 1]
+            rays = RAYS[piece_type]
+            for d in range(len(rays)):
+                open_ray = np.ones(len(square), dtype=np.bool_)
+                for step in range(7):
+                    target = rays[d, square, step]
+                    open_ray &= target >= 0
+                    target = np.where(open_ray, target, 0)
+                    attacks |= np.where(open_ray, BIT[target], np.uint64(0))
+                    open_ray &= ~_occupied_by(target, others)
+    return attacks
+
+def _analyse(layout, chunk=1 << 20):
+    """Legality of every index for both sides to move, plus Black's legal move counts and mates."""
+    valid_w = np.zeros(layout.size, dtype=np.bool_)
+    valid_b = np.zeros(layout.size, dtype=np.bool_)
+    moves_b = np.zeros(layout.size, dtype=np.uint8)
+    mated_b = np.zeros(layout.size, dtype=np.bool_)
+    for start in range(0, layout.size, chunk):
+        index = np.arange(start, min(start + chunk, layout.size), dtype=np.int64)
+        squares = layout.decode(index)
+        wk, bk = squares[0], squares[1]
+        valid = (KING_ATTACKS[wk] & BIT[bk]) == 0
+        for i in range(layout.count):
+            for j in range(i + 1, layout.count):
+                valid &= squares[i] != squares[j]
+        for i, piece_type in enumerate(layout.pieces):
+            if piece_type == chess.PAWN:
+                valid &= (squares[2 + i] >= 8) & (squares[2 + i] < 56)
+        attacks = _white_attacks(layout.pieces, squares)
+        in_check = (attacks & BIT[bk]) != 0
+        count = _popcount(KING_ATTACKS[bk] & ~attacks)
+        window = slice(start, start + len(index))
+        valid_w[window] = valid & ~in_check
+        valid_b[window] = valid
+        moves_b[window] = np.where(valid, count, 0)
+        mated_b[window] = valid & in_check & (count == 0)
+    return valid_w, valid_b, moves_b, mated_b
+
+def _white_predecessors(layout, index):
+    """White-to-move indices that reach the given Black-to-move indices with one white move."""
+    squares = layout.decode(index)
+    preds = []
+    for i, piece_type in enumerate([chess.KING] + layout.pieces):
+        slot = 0 if i == 0 else i + 1
+        blockers = [s for j, s in enumerate(squares) if j != slot]
+        for origin, ok in _piece_moves(piece_type, squares[slot], blockers, backwards=True):
+            if ok.any():
+                moved = list(squares)
+                moved[slot] = origin
+                preds.append(layout.encode([s[ok] for s in moved]))
+    return np.concatenate(preds) if preds else np.zeros(0, dtype=np.int64)
+
+def _black_predecessors(layout, index):
+    """Black-to-move indices that reach the given White-to-move indices with one black king move."""
+    squares = layout.decode(index)
+    preds = []
+    blockers = [s for j, s in enumerate(squares) if j != 1]
+    for origin, ok in _piece_moves(chess.KING, squares[1], blockers):
+        if ok.any():
+            moved = list(squares)
+            moved[1] = origin
+            preds.append(layout.encode([s[ok] for s in moved]) + layout.size)
+    return np.concatenate(preds) if preds else np.zeros(0, dtype=np.int64)
+
+def _promotion_wins(layout, tables):
+    """For KPK: {ply: white-to-move indices} won by promoting into an already generated table."""
+    seeds = {}
+    index = np.arange(layout.size, dtype=np.int64)
+    wk, bk, pawn = layout.decode(index)
+    target = pawn + 8
+    ok = (pawn >= 48) & (pawn < 56) & (target != wk) & (target != bk)
+    for piece_type, name in PROMOTION_TABLES.items():
+        result = tables[name][1][(((wk[ok] << 6) | bk[ok]) << 6) | target[ok]]
+        won = result > 0
+        # A position lost in n plies for Black is won in n + 1 plies by the promoting move
+        for ply in np.unique(result[won]):
+            seeds.setdefault(int(ply), []).append(index[ok][won][result[won] == ply])
+    return {ply: np.concatenate(parts) for ply, parts in seeds.items()}
+
+def generate(name, tables=None, verbose=True):
+    layout = _Layout(TABLES[name])
+    start_time = time.time()
+    valid_w, valid_b, moves_b, mated_b = _analyse(layout)
+    # result[0] is White to move, result[1] Black to move; flattened indexes carry the side in the high bits
+    result = np.zeros((2, layout.size), dtype=np.uint8)
+    flat = result.reshape(-1)
+    valid = np.concatenate([valid_w, valid_b])
+    seeds = _promotion_wins(layout, tables) if chess.PAWN in layout.pieces else {}
+
+    lost = np.flatnonzero(mated_b) + layout.size
+    flat[lost] = 1
+    ply = 0
+    while len(lost) or any(p > ply for p in seeds):
+        # White wins in ply + 1 by moving into a position lost for Black in ply
+        won = _white_predecessors(layout, lost - layout.size) if len(lost) else np.zeros(0, dtype=np.int64)
+        if ply + 1 in seeds:
+            won = np.concatenate([won, seeds.pop(ply + 1)])
+        won = np.unique(won)
+        won = won[valid[won] & (flat[won] == 0)]
+        flat[won] = ply + 2
+        # Black loses in ply + 2 once every one of its moves leads to a won position
+        preds = _black_predecessors(layout, won)
+        preds = preds[valid[preds]]
+        np.subtract.at(moves_b, preds - layout.size, 1)
+        lost = np.unique(preds)
+        lost = lost[(moves_b[lost - layout.size] == 0) & (flat[lost] == 0)]
+        flat[lost] = ply + 3
+        ply += 2
+    if verbose:
+        print(f"{name}: {np.count_nonzero(result[0])} won / {np.count_nonzero(valid_w)} legal white-to-move positions, "
+              f"longest mate {int(result.max()) - 1} plies, {time.time() - start_time:.1f}s")
+    return result
+
+def generate_all(directory='bitbases', names=None):
+    os.makedirs(directory, exist_ok=True)
+    names = names or list(TABLES)
+    tables = {}
+    for name in sorted(names, key=lambda n: chess.PAWN in TABLES[n]):
+        if chess.PAWN in TABLES[name]:
+            for dependency in PROMOTION_TABLES.values():
+                if dependency not in tables:
+                    tables[dependency] = generate(dependency)
+        tables[name] = generate(name, tables)
+        np.save(os.path.join(directory, name + '.npy'), tables[name])
+    return tables
+
+class Bitbases:
+    """Memory-mapped bitbase tables with O(1) probing for matching material."""
+    def __init__(self, directory='bitbases'):
+        self.tables = {}
+        if os.path.isdir(directory):
+            for name, pieces in TABLES.items():
+                path = os.path.join(directory, name + '.npy')
+                if os.path.exists(path):
+                    self.tables[tuple(pieces)] = np.load(path, mmap_mode='r')
+        self.max_pieces = max((2 + len(pieces) for pieces in self.tables), default=0)
+        self.hits = 0
+        if not self.tables:
+            print(f"No bitbases found in {directory!r}, run `python bitbase.py` to generate them.")
+
+    def probe(self, board):
+        """Returns (wdl, plies to mate) for the side to move, or None if no table matches."""
+        if chess.popcount(board.occupied) > self.max_pieces or board.castling_rights:
+            return None
+        if board.occupied_co[chess.BLACK] == board.kings & board.occupied_co[chess.BLACK]:
+            strong = chess.WHITE
+        elif board.occupied_co[chess.WHITE] == board.kings & board.occupied_co[chess.WHITE]:
+            strong = chess.BLACK
+        else:
+            return None
+        for pieces, table in self.tables.items():
+            squares = [board.king(strong), board.king(not strong)]
+            for piece_type in pieces:
+                mask = board.pieces_mask(piece_type, strong)
+                if chess.popcount(mask) != 1:
+                    break
+                squares.append(chess.lsb(mask))
+            else:
+                if len(squares) - 1 != chess.popcount(board.occupied_co[strong]):
+                    continue
+                index = 0
+                for square in squares:
+                    index = (index << 6) | (square if strong == chess.WHITE else chess.square_mirror(square))
+                side = 0 if board.turn == strong else 1
+                value = int(table[side, index])
+                self.hits += 1
+                if value == 0:
+                    return 0, 0
+                return (2 if side == 0 else -2), value - 1
+        return None
+
+    def probe_root(self, board):
+        """Picks the fastest mate when winning and the slowest loss when losing, or None if not covered."""
+        if self.probe(board) is None:
+            return None
+        best_move = None
+        best_rank = None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    rank = (3, 0)
+                elif board.is_insufficient_material():
+                    rank = (0, 0)
+                else:
+                    probe = self.probe(board)
+                    if probe is None:
+                        return None
+                    wdl, plies = probe
+                    rank = (-wdl, -plies if wdl < 0 else plies)
+            finally:
+                board.pop()
+            if best_rank is None or rank > best_rank:
+                best_rank = rank
+                best_move = move
+        return best_move
+
+if __name__ == "__main__":
+    generate_all(names=sys.argv[1:] or None)
@@ -0,0 +1,29 @@
+import numpy as np
+import chess
+
+# Plane order used by the CNN: same as the notebook's ['p', 'r', 'n', 'b', 'q', 'k']
+PIECE_ORDER = [chess.PAWN, chess.ROOK, chess.KNIGHT, chess.BISHOP, chess.QUEEN, chess.KING]
+
+def board_bitboards(board):
+    """12 bitboards: white p, r, n, b, q, k followed by black p, r, n, b, q, k."""
+    return np.array([board.pieces_mask(piece_type, color) for color in (chess.WHITE, chess.BLACK) for piece_type in PIECE_ORDER], dtype=np.uint64)
+
+def bitboards_2_rep(bitboards):
+    """
+    (..., 12) bitboards -> (..., 6, 8, 8) float32 planes with +1 for white and -1 for black pieces.
+    Rows run from rank 8 down to rank 1 and columns from file a to h, like str(board).
+    """
+    bitboards = np.ascontiguousarray(bitboards, dtype='<u8')
+    bits = np.unpackbits(bitboards.view(np.uint8), axis=-1, bitorder='little')
+    bits = bits.reshape(bitboards.shape[:-1] + (2, 6, 8, 8)).astype(np.int8)
+    planes = bits[..., 0, :, :, :] - bits[..., 1, :, :, :]
+    return planes[..., ::-1, :].astype(np.float32)
+
+def board_2_rep(board):
+    return bitboards_2_rep(board_bitboards(board))
+
+def boards_2_rep(boards):
+    """Batch variant: N boards -> (N, 6, 8, 8)."""
+    if not len(boards):
+        return np.zeros((0, 6, 8, 8), dtype=np.float32)
+    return bitboards_2_rep(np.stack([board_bitboards(board) for board in boards]))
@@ -0,0 +1,208 @@
+import os
+import numpy as np
+import chess
+import chess.polyglot
+
+# Polyglot entries are 16 big-endian bytes: key, move, weight, learn
+ENTRY_DTYPE = np.dtype([('key', '>u8'), ('move', '>u2'), ('weight', '>u2'), ('learn', '>u4')])
+
+def decode_move(board, raw_move):
+    to_square = raw_move & 0x3f
+    from_square = (raw_move >> 6) & 0x3f
+    promotion_part = (raw_move >> 12) & 0x7
+    promotion = promotion_part + 1 if promotion_part else None
+    # Polyglot writes castling as king takes own rook (e1h1), python-chess expects e1g1
+    if board.kings & chess.BB_SQUARES[from_square] and board.rooks & board.occupied_co[board.turn] & chess.BB_SQUARES[to_square]:
+        to_square = chess.square(6 if to_square > from_square else 2, chess.square_rank(from_square))
+    return chess.Move(from_square, to_square, promotion)
+
+def encode_move(board, move):
+    # Inverse of decode_move: castling is written as the king taking its own rook
+    to_square = move.to_square
+    if board.is_castling(move):
+        to_square = chess.square(7 if to_square > move.from_square else 0, chess.square_rank(move.from_square))
+    promotion_part = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion_part << 12)
+
+class OpeningBook:
+    """
+    All available polyglot books, memory-mapped once and merged into a single sorted key index.
+    Lookup is one binary search; entries for a key are ordered by book priority (file order) and then weight,
+    so the first legal entry is what probing the books one by one would have returned.
+
+    probe() also tracks the game: after max_misses consecutive misses the game is out of book and
+    positions are only looked up again if their key passes a bit-array prefilter built from the book keys.
+    """
+    def __init__(self, filenames, max_misses=2, filter_bits=22):
+        self.books = []
+        self.missing = []
+        for filename in filenames:
+            if os.path.exists(filename):
+                # np.memmap cannot map an empty file, e.g. compile_books' output when no book was found
+                if os.path.getsize(filename):
+                    self.books.append(np.memmap(filename, dtype=ENTRY_DTYPE, mode='r'))
+            else:
+                self.missing.append(filename)
+        if self.missing:
+            print(f"Opening books not found, skipping: {', '.join(self.missing)}")
+
+        keys = [book['key'].astype(np.uint64) for book in self.books]
+        sources = [np.full(len(book), i, dtype=np.uint8) for i, book in enumerate(self.books)]
+        rows = [np.arange(len(book), dtype=np.uint32) for book in self.books]
+        weights = [book['weight'].astype(np.int32) for book in self.books]
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.uint64)
+        sources = np.concatenate(sources) if sources else np.zeros(0, dtype=np.uint8)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.uint32)
+        weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.int32)
+        order = np.lexsort((-weights, sources, keys))
+        self.keys = keys[order]
+        self.sources = sources[order]
+        self.rows = rows[order]
+
+        # One bit per (key & filter_mask); a clear bit means the position is certainly not in any book
+        self.filter_mask = (1 << filter_bits) - 1
+        present = np.zeros(1 << filter_bits, dtype=np.bool_)
+        present[(self.keys & np.uint64(self.filter_mask)).astype(np.int64)] = True
+        self.filter = np.packbits(present, bitorder='little')
+
+        self.max_misses = max_misses
+        self.new_game()
+
+    def new_game(self):
+        self.misses = 0
+        self.out_of_book = False
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def entries(self, key):
+        """Yields (raw move, weight) for a Zobrist key in priority order."""
+        key = np.uint64(key)
+        lo = np.searchsorted(self.keys, key, side='left')
+        hi = np.searchsorted(self.keys, key, side='right')
+        for i in range(lo, hi):
+            entry = self.books[self.sources[i]][self.rows[i]]
+            yield int(entry['move']), int(entry['weight'])
+
+    def might_contain(self, key):
+        index = key & self.filter_mask
+        return bool(self.filter[index >> 3] >> (index & 7) & 1)
+
+    def find_move(self, board, minimum_weight=1, key=None):
+        if key is None:
+            key = chess.polyglot.zobrist_hash(board)
+        for raw_move, weight in self.entries(key):
+            if weight < minimum_weight:
+                continue
+            move = decode_move(board, raw_move)
+            if board.is_legal(move):
+                return move
+        return None
+
+    def probe(self, board):
+        """find_move() with per-game out-of-book tracking; call new_game() when the board is reset."""
+        key = chess.polyglot.zobrist_hash(board)
+        if self.out_of_book and not self.might_contain(key):
+            self.skipped += 1
+            return None
+        move = self.find_move(board, key=key)
+        if move is None:
+            self.misses += 1
+            self.out_of_book = self.misses >= self.max_misses
+        else:
+            # A transposition back into book
+            self.misses = 0
+            self.out_of_book = False
+        return move
+
+def write_book(filename, keys, moves, weights, tiebreak=None):
+    """Writes entries as a polyglot book, sorted by key, then by descending weight, then by tiebreak."""
+    columns = (-np.asarray(weights, dtype=np.int64), keys)
+    order = np.lexsort(columns if tiebreak is None else (tiebreak,) + columns)
+    entries = np.zeros(len(order), dtype=ENTRY_DTYPE)
+    entries['key'] = np.asarray(keys)[order]
+    entries['move'] = np.asarray(moves)[order]
+    entries['weight'] = np.asarray(weights)[order]
+    entries.tofile(filename)
+    return len(entries)
+
+def _group_starts(*columns):
+    # Start index of every run of equal rows in already sorted columns
+    change = np.zeros(len(columns[0]), dtype=np.bool_)
+    change[0:1] = True
+    for column in columns:
+        change[1:] |= column[1:] != column[:-1]
+    return np.flatnonzero(change)
+
+def compile_books(filenames, output, merge='sum', min_weight=1, min_share=0.0):
+    """
+    Merges polyglot books into one sorted book with a single entry per (position, move).
+    merge='sum' adds weights across books, 'max' keeps the largest, and 'priority' keeps
+    only the entries of the first book (in list order) that knows the position, like get_book_move did.
+    Entries below min_weight or below min_share of their position's total weight are pruned;
+    the best move of every position is always kept.
+    """
+    books = [np.fromfile(f, dtype=ENTRY_DTYPE) for f in filenames if os.path.exists(f)]
+    if not books:
+        print(f"None of the {len(filenames)} books exist, writing an empty book to {output}")
+        books = [np.zeros(0, dtype=ENTRY_DTYPE)]
+    keys = np.concatenate([book['key'].astype(np.uint64) for book in books])
+    moves = np.concatenate([book['move'].astype(np.uint16) for book in books])
+    weights = np.concatenate([book['weight'].astype(np.int64) for book in books])
+    priority = np.concatenate([np.full(len(book), i, dtype=np.int64) for i, book in enumerate(books)])
+    # Position in the concatenated books, used to keep equal weights in their original order
+    rank = np.arange(len(keys), dtype=np.int64)
+    alive = weights > 0  # Weight 0 is the polyglot convention for a deleted entry
+    keys, moves, weights, priority, rank = keys[alive], moves[alive], weights[alive], priority[alive], rank[alive]
+    if not len(keys):
+        return write_book(output, keys, moves, weights.astype(np.uint16))
+
+    if merge == 'priority':
+        order = np.lexsort((priority, keys))
+        keys, moves, weights, priority, rank = keys[order], moves[order], weights[order], priority[order], rank[order]
+        starts = _group_starts(keys)
+        first = np.repeat(priority[starts], np.diff(np.append(starts, len(keys))))
+        keep = priority == first
+        keys, moves, weights, rank = keys[keep], moves[keep], weights[keep], rank[keep]
+
+    order = np.lexsort((moves, keys))
+    keys, moves, weights, rank = keys[order], moves[order], weights[order], rank[order]
+    starts = _group_starts(keys, moves)
+    rank = np.minimum.reduceat(rank, starts)
+    if merge == 'sum':
+        weights = np.add.reduceat(weights, starts)
+    elif merge in ('max', 'priority'):
+        weights = np.maximum.reduceat(weights, starts)
+    else:
+        raise ValueError(f"unknown merge mode {merge!r}")
+    keys, moves = keys[starts], moves[starts]
+
+    # Per-position totals and maxima, broadcast back to every entry of the position
+    position_starts = _group_starts(keys)
+    counts = np.diff(np.append(position_starts, len(keys)))
+    totals = np.repeat(np.add.reduceat(weights, position_starts), counts)
+    best = np.repeat(np.maximum.reduceat(weights, position_starts), counts)
+
+    keep = ((weights >= min_weight) & (weights >= min_share * totals)) | (weights == best)
+    keys, moves, weights, best, rank = keys[keep], moves[keep], weights[keep], best[keep], rank[keep]
+    # Summed weights can overflow 16 bits; rescale those positions so their best move gets 65535
+    weights = np.where(best > 0xffff, np.maximum(weights * 0xffff // np.maximum(best, 1), 1), weights)
+    return write_book(output, keys, moves, weights.astype(np.uint16), tiebreak=rank)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Merge polyglot books into one deduplicated weighted book.")
+    parser.add_argument('books', nargs='*', help="books in priority order (default: the polyglot-collection books in engine order)")
+    parser.add_argument('-o', '--output', default='compiled-book.bin')
+    parser.add_argument('--merge', choices=['sum', 'max', 'priority'], default='sum')
+    parser.add_argument('--min-weight', type=int, default=1)
+    parser.add_argument('--min-share', type=float, default=0.0, help="prune moves below this fraction of their position's weight")
+    args = parser.parse_args()
+    books = args.books or [os.path.join('polyglot-collection', filename) for filename in [
+        'Perfect2023.bin', 'Titans.bin', 'baron30.bin', 'Elo2400.bin', 'final-book.bin',
+        'gm2001.bin', 'gm2600.bin', 'Performance.bin', 'varied.bin'
+    ]]
+    before = sum(os.path.getsize(f) for f in books if os.path.exists(f))
+    count = compile_books(books, args.output, args.merge, args.min_weight, args.min_share)
+    print(f"Wrote {count} entries to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB, from {before / 1e6:.1f} MB)")
@@ -0,0 +1,188 @@
+"""
+Resumable training checkpoints for cnn.ipynb.
+
+A checkpoint holds everything needed to continue a run as if it had never stopped: model, optimizer and
+scheduler state, the python / NumPy / torch / CUDA RNG states, the epoch, the number of batches already
+trained in it and the position of the data loader within the epoch. For ShardDataset that position is an
+offset into ResumableSampler's seeded permutation; for GameStream, whose order is fixed by its seed and
+epoch, it is the number of batches to skip.
+
+Writes go through a background thread: the state is copied to CPU on the training thread (the only part
+that has to stop training) and serialized to a temporary file that replaces the previous checkpoint with
+os.replace, so a crash mid-write never leaves a truncated checkpoint behind.
+"""
+import os
+import glob
+import random
+import itertools
+import threading
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+class ResumableSampler(Sampler):
+    """
+    Replaces shuffle=True: a permutation seeded by (seed, epoch) that can start part way through the epoch.
+    With num_replicas > 1 each rank gets every num_replicas-th index, padded so all ranks have the same count,
+    like DistributedSampler. With `weights` (e.g. ShardDataset.weights after dedup) an epoch is len(data_source)
+    draws with replacement, each sample drawn in proportion to its weight.
+    """
+    def __init__(self, data_source, seed=0, num_replicas=1, rank=0, weights=None):
+        self.size = len(data_source)
+        self.cumulative = None if weights is None else torch.cumsum(torch.as_tensor(weights, dtype=torch.float64), 0)
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.num_samples = -(-self.size // num_replicas)
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        self.epoch = epoch
+        self.start = start
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed * 1000003 + self.epoch)
+        if self.cumulative is None:
+            order = torch.randperm(self.size, generator=generator)
+        else:
+            draws = torch.rand(self.size, generator=generator, dtype=torch.float64) * self.cumulative[-1]
+            order = torch.searchsorted(self.cumulative, draws, right=True).clamp_(max=self.size - 1)
+        padding = self.num_samples * self.num_replicas - self.size
+        if padding:
+            order = torch.cat([order, order[:padding]])
+        return iter(order[self.rank::self.num_replicas][self.start:].tolist())
+
+    def __len__(self):
+        return max(self.num_samples - self.start, 0)
+
+def epoch_batches(loader, epoch, start_batch=0):
+    """Positions `loader` at batch start_batch of `epoch` and returns what the training loop should iterate."""
+    if isinstance(loader.sampler, ResumableSampler):
+        loader.sampler.set_epoch(epoch, start_batch * loader.batch_size)
+        return loader
+    if hasattr(loader.dataset, 'set_epoch'):
+        loader.dataset.set_epoch(epoch)
+    # Streams cannot seek; replaying the epoch's order up to the checkpoint is exact, just not free
+    return itertools.islice(loader, start_batch, None) if start_batch else loader
+
+def _to_cpu(obj):
+    """Deep copy of a (nested) state dict with every tensor cloned to CPU, safe to serialize while training goes on."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: _to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    return obj
+
+def rng_state():
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+class Checkpointer:
+    """
+    Saves step_<n>.pth to `directory` every `every` training batches (and whenever save() is called), keeping
+    the newest `keep`. load() restores the newest one into the given objects.
+    """
+    def __init__(self, directory='checkpoints', every=2000, keep=3):
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.step = 0
+        self.thread = None
+        self.error = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self):
+        paths = glob.glob(os.path.join(self.directory, 'step_*.pth'))
+        return sorted(paths, key=lambda path: int(os.path.basename(path)[len('step_'):-len('.pth')]))
+
+    def latest(self):
+        paths = self._paths()
+        return paths[-1] if paths else None
+
+    def _write(self, state, path):
+        try:
+            temporary = path + '.tmp'
+            with open(temporary, 'wb') as f:
+                torch.save(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+            for old in self._paths()[:-self.keep]:
+                os.remove(old)
+        except Exception as e:
+            self.error = e
+
+    def wait(self):
+        """Blocks until the last checkpoint is on disk; re-raises a failed write."""
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, model, optimizer, scheduler, epoch, batch, **extra):
+        """
+        Checkpoints the state after `batch` batches of `epoch` have been trained; extra values (running loss,
+        loss history, ...) are stored as they are and handed back by load().
+        """
+        state = _to_cpu({
+            'step': self.step,
+            'epoch': epoch,
+            'batch': batch,
+            'model_state_dict': model.state_dict(),
+            'optimizer_state_dict': optimizer.state_dict(),
+            'scheduler_state_dict': scheduler.state_dict() if scheduler is not None else None,
+            'rng_state': rng_state(),
+            'extra': extra,
+        })
+        # At most one write in flight, so a slow disk holds back training instead of piling up copies in memory
+        self.wait()
+        path = os.path.join(self.directory, f'step_{self.step:08d}.pth')
+        self.thread = threading.Thread(target=self._write, args=(state, path), name='checkpoint-writer', daemon=True)
+        self.thread.start()
+
+    def end_batch(self, model, optimizer, scheduler, epoch, batch, **extra):
+        """Call after every optimizer step; saves every `every` steps."""
+        self.step += 1
+        if self.step % self.every == 0:
+            self.save(model, optimizer, scheduler, epoch, batch, **extra)
+
+    def load(self, model, optimizer=None, scheduler=None, path=None, map_location=None):
+        """
+        Restores the newest checkpoint (or `path`) and returns a dict with 'epoch', 'batch', 'step' and the
+        extra values; None when there is nothing to resume from.
+        """
+        path = path or self.latest()
+        if path is None:
+            return None
+        state = torch.load(path, map_location=map_location, weights_only=False)
+        model.load_state_dict(state['model_state_dict'])
+        if optimizer is not None:
+            optimizer.load_state_dict(state['optimizer_state_dict'])
+        if scheduler is not None and state['scheduler_state_dict'] is not None:
+            scheduler.load_state_dict(state['scheduler_state_dict'])
+        # RNG states were saved on CPU; torch.load may have moved them with map_location
+        rng = state['rng_state']
+        rng['torch'] = rng['torch'].cpu()
+        if 'cuda' in rng:
+            rng['cuda'] = [generator.cpu() for generator in rng['cuda']]
+        set_rng_state(rng)
+        self.step = state['step']
+        return dict(state['extra'], epoch=state['epoch'], batch=state['batch'], step=state['step'])
+
+    def close(self):
+        self.wait()
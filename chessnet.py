@@ -0,0 +1,57 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+# Define the neural network modules
+class module(nn.Module):
+
+    def __init__(self, hidden_size):
+        super(module, self).__init__()
+        self.conv1 = nn.Conv2d(hidden_size, hidden_size, 3, stride=1, padding=1)
+        self.conv2 = nn.Conv2d(hidden_size, hidden_size, 3, stride=1, padding=1)
+        self.bn1 = nn.BatchNorm2d(hidden_size)
+        self.bn2 = nn.BatchNorm2d(hidden_size)
+        self.activation1 = nn.SELU()
+        self.activation2 = nn.SELU()
+
+    def forward(self, x):
+        x_input = torch.clone(x)
+        x = self.conv1(x)
+        x = self.bn1(x)
+        x = self.activation1(x)
+        x = self.conv2(x)
+        x = self.bn2(x)
+        x = x + x_input
+        x = self.activation2(x)
+        return x
+
+# Define the ChessNet class
+class ChessNet(nn.Module):
+
+    def __init__(self, hidden_layers=8, hidden_size=200):
+        super(ChessNet, self).__init__()
+        self.hidden_layers = hidden_layers
+        self.input_layer = nn.Conv2d(6, hidden_size, 3, stride=1, padding=1)
+        self.module_list = nn.ModuleList([module(hidden_size) for i in range(hidden_layers)])
+        self.output_layer = nn.Conv2d(hidden_size, 2, 3, stride=1, padding=1)
+
+    def forward(self, x):
+        x = self.input_layer(x)
+        x = F.relu(x)
+
+        for i in range(self.hidden_layers):
+            x = self.module_list[i](x)
+
+        x = self.output_layer(x)
+
+        return x
+
+def load_chessnet(path, map_location='cpu'):
+    """Loads a ChessNet from either a training checkpoint (best_model.pth) or a bare state dict (final_chess_net.pth)."""
+    state = torch.load(path, map_location=map_location)
+    if 'model_state_dict' in state:
+        state = state['model_state_dict']
+    model = ChessNet()
+    model.load_state_dict(state)
+    model.eval()
+    return model
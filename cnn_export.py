@@ -0,0 +1,159 @@
+"""
+CPU inference for ChessNet: frozen TorchScript / ONNX export, int8 quantization, channels-last layout,
+a CPU inference wrapper, a per-position latency benchmark and an accuracy check against the fp32 model.
+
+    python cnn_export.py best_model.pth -o chess_net_cpu.pt --quantize --onnx chess_net.onnx
+
+Dynamic quantization only covers Linear and recurrent layers, and ChessNet is all convolutions, so
+--quantize does static post-training int8 quantization (FX graph mode) calibrated on real positions.
+"""
+import os
+import copy
+import time
+import random
+import argparse
+import numpy as np
+import chess
+import torch
+from chessnet import load_chessnet
+from policy import network_planes, move_probabilities
+
+def set_cpu_threads(threads=None, cores=None):
+    """Pins the process to `cores` (if given) and sets the intra-op thread count, by default one per usable core."""
+    if cores is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    if threads is None:
+        threads = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Can only be set once, before any parallel work
+    return threads
+
+def random_positions(count, seed=0, max_plies=80):
+    """Positions from random games, for calibration and benchmarking when no dataset is at hand."""
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = chess.Board()
+        for _ in range(rng.randint(1, max_plies)):
+            if board.is_game_over():
+                break
+            board.push(rng.choice(list(board.legal_moves)))
+        boards.append(board)
+    return boards
+
+def network_input(boards):
+    return torch.from_numpy(network_planes(boards))
+
+def quantize_int8(model, calibration, batch_size=64):
+    """Static int8 copy of `model` calibrated on the `calibration` planes; `model` itself stays fp32."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+    engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'fbgemm'
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), example_inputs=(calibration[:1],))
+    with torch.inference_mode():
+        for start in range(0, len(calibration), batch_size):
+            prepared(calibration[start:start + batch_size])
+    return convert_fx(prepared)
+
+def export_torchscript(model, path, quantize=False, channels_last=True, calibration=None):
+    # Quantization and the channels-last conversion work in place; the caller keeps the fp32 model as it was
+    model = copy.deepcopy(model).cpu().eval()
+    if calibration is None:
+        calibration = network_input(random_positions(512))
+    if quantize:
+        model = quantize_int8(model, calibration)
+    example = calibration[:1]
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+        example = example.contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        scripted = torch.jit.freeze(torch.jit.trace(model, example))
+    scripted.save(path)
+    return scripted
+
+def export_onnx(model, path):
+    model = model.cpu().eval()
+    example = network_input([chess.Board()])
+    torch.onnx.export(model, example, path, input_names=['planes'], output_names=['from_to'],
+                      dynamic_axes={'planes': {0: 'batch'}, 'from_to': {0: 'batch'}}, opset_version=17)
+
+class CpuPolicy:
+    """
+    Exported ChessNet on the CPU; call with a (N, 6, 8, 8) tensor or array, returns the (N, 2, 8, 8) output as numpy.
+    torch's thread settings are process-wide, so they are only changed (through set_cpu_threads) when `threads`
+    or `cores` is given; otherwise the policy runs with whatever the process already uses.
+    """
+    def __init__(self, path, threads=None, cores=None, channels_last=True):
+        if threads is not None or cores is not None:
+            set_cpu_threads(threads, cores)
+        self.threads = torch.get_num_threads()
+        self.model = torch.jit.load(path, map_location='cpu')
+        self.model.eval()
+        self.channels_last = channels_last
+
+    def __call__(self, x):
+        x = torch.as_tensor(x, dtype=torch.float32).cpu()
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode():
+            return self.model(x).numpy()
+
+def benchmark(models, positions, warmup=20):
+    """Batch-of-one latency per position: {name: (p50 ms, p99 ms)} for each callable in `models`."""
+    inputs = [network_input([board]) for board in positions]
+    results = {}
+    for name, model in models.items():
+        with torch.inference_mode():
+            for x in inputs[:warmup]:
+                model(x)
+            times = []
+            for x in inputs:
+                start = time.perf_counter()
+                model(x)
+                times.append((time.perf_counter() - start) * 1000)
+        results[name] = (float(np.percentile(times, 50)), float(np.percentile(times, 99)))
+        print(f"{name:>12}: p50 {results[name][0]:.3f} ms, p99 {results[name][1]:.3f} ms")
+    return results
+
+def agreement(reference, candidate, positions):
+    """
+    How closely `candidate` (e.g. the int8 export) follows `reference` (the fp32 model): the share of positions
+    where both pick the same most probable legal move, and the largest absolute difference of their outputs.
+    """
+    x = network_input(positions)
+    with torch.inference_mode():
+        expected = np.asarray(reference(x), dtype=np.float32)
+        actual = np.asarray(candidate(x), dtype=np.float32)
+    same = total = 0
+    for board, a, b in zip(positions, expected, actual):
+        moves = list(board.legal_moves)
+        if moves:
+            same += np.argmax(move_probabilities(a, moves)) == np.argmax(move_probabilities(b, moves))
+            total += 1
+    result = (float(same / total) if total else 1.0, float(np.abs(expected - actual).max()))
+    print(f"top-1 move agreement {100 * result[0]:.1f}% over {total} positions, max abs output difference {result[1]:.4f}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export ChessNet for CPU inference and benchmark it.")
+    parser.add_argument('checkpoint', nargs='?', default='best_model.pth')
+    parser.add_argument('-o', '--output', default='chess_net_cpu.pt')
+    parser.add_argument('--quantize', action='store_true', help="static int8 quantization")
+    parser.add_argument('--no-channels-last', action='store_true')
+    parser.add_argument('--onnx', default=None, help="also write an ONNX model to this path")
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--positions', type=int, default=500, help="positions in the latency benchmark")
+    args = parser.parse_args()
+
+    set_cpu_threads(args.threads)
+    model = load_chessnet(args.checkpoint)
+    export_torchscript(model, args.output, args.quantize, not args.no_channels_last)
+    if args.onnx:
+        export_onnx(model, args.onnx)
+    policy = CpuPolicy(args.output, channels_last=not args.no_channels_last)
+    benchmark({'eager': model, 'exported': policy}, random_positions(args.positions, seed=1))
+    agreement(model, policy, random_positions(args.positions, seed=2))
@@ -0,0 +1,201 @@
+"""
+ChessNet training on CPU-only machines.
+
+The training step is the notebook's (from/to cross-entropy, Adam), run under bf16 autocast when the CPU has
+native bf16 instructions (AVX512-BF16 or AMX); without them bf16 is emulated and slower than float32, so
+autocast stays off. With --processes N, N local processes train data-parallel with DistributedDataParallel
+over the gloo backend: each process is pinned to its own block of cores, runs that many intra-op threads and
+reads its own slice of the samples through ResumableSampler, so checkpoints resume exactly as in the notebook.
+
+    python cpu_train.py train shards/train --processes 4 --epochs 1 -o chess_net_cpu_trained.pth
+    python cpu_train.py scale shards/train --max-processes 8 --steps 50
+
+`scale` trains a fixed number of steps with 1, 2, 4, ... N processes and reports throughput, speedup and
+parallel efficiency. The per-process batch stays fixed, so N processes train on N times the samples per step.
+"""
+import os
+import time
+import socket
+import argparse
+from contextlib import nullcontext
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, TensorDataset
+from chessnet import ChessNet
+from cnn_export import set_cpu_threads
+from checkpoints import ResumableSampler, Checkpointer, epoch_batches
+
+def bf16_supported():
+    """True when the CPU executes bf16 natively; autocast on anything else only adds conversions."""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    return bool(flags & {'avx512_bf16', 'amx_bf16'})
+
+def autocast(device, enabled=None):
+    """bf16 autocast for the forward pass on CPU (by default when bf16_supported()); a no-op on other devices."""
+    device = torch.device(device)
+    if device.type != 'cpu':
+        return nullcontext()
+    if enabled is None:
+        enabled = bf16_supported()
+    return torch.autocast('cpu', dtype=torch.bfloat16, enabled=enabled)
+
+def policy_loss(outputs, targets):
+    """The notebook's loss: cross-entropy over the 64 from squares plus over the 64 to squares."""
+    outputs = outputs.float()
+    targets_from = targets[:, 0].reshape(-1, 64).argmax(dim=1)
+    targets_to = targets[:, 1].reshape(-1, 64).argmax(dim=1)
+    return nn.functional.cross_entropy(outputs[:, 0].reshape(-1, 64), targets_from) + \
+        nn.functional.cross_entropy(outputs[:, 1].reshape(-1, 64), targets_to)
+
+def core_blocks(processes):
+    """Splits the usable cores into one contiguous block per process (shared round-robin if there are too few)."""
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    blocks = []
+    for rank in range(processes):
+        block = cores[rank * len(cores) // processes:(rank + 1) * len(cores) // processes]
+        blocks.append(block or [cores[rank % len(cores)]])
+    return blocks
+
+def synthetic_dataset(samples, seed=0):
+    """Random planes and one-hot from/to targets, for timing runs without shards."""
+    rng = np.random.default_rng(seed)
+    planes = rng.integers(-1, 2, size=(samples, 6, 8, 8)).astype(np.float32)
+    targets = np.zeros((samples, 2, 64), dtype=np.float32)
+    targets[np.arange(samples), 0, rng.integers(0, 64, samples)] = 1
+    targets[np.arange(samples), 1, rng.integers(0, 64, samples)] = 1
+    return TensorDataset(torch.from_numpy(planes), torch.from_numpy(targets.reshape(samples, 2, 8, 8)))
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _worker(rank, world_size, args, port, results):
+    cores = core_blocks(world_size)[rank]
+    threads = set_cpu_threads(len(cores), cores)
+    if world_size > 1:
+        dist.init_process_group('gloo', init_method=f'tcp://127.0.0.1:{port}', rank=rank, world_size=world_size)
+    torch.manual_seed(args.seed)  # Identical initial weights on every rank
+    if args.shards:
+        from shards import ShardDataset
+        dataset = ShardDataset(args.shards)
+    else:
+        dataset = synthetic_dataset(args.synthetic, args.seed)
+    sampler = ResumableSampler(dataset, args.seed, num_replicas=world_size, rank=rank, weights=getattr(dataset, 'weights', None))
+    loader = DataLoader(dataset, batch_size=args.batch_size, sampler=sampler, num_workers=args.workers, drop_last=True)
+
+    model = ChessNet()
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
+    checkpointer = Checkpointer(args.checkpoint_dir, every=args.checkpoint_every) if args.checkpoint_dir else None
+    resume = checkpointer.load(model, optimizer) if checkpointer else None
+    start_epoch, start_batch = (resume['epoch'], resume['batch']) if resume else (0, 0)
+    ddp_model = DistributedDataParallel(model) if world_size > 1 else model
+    bf16 = bf16_supported() if args.bf16 is None else args.bf16
+
+    if rank == 0:
+        print(f"{world_size} process(es) x {threads} thread(s), bf16 autocast {'on' if bf16 else 'off'}, "
+              f"{len(loader)} batches per rank per epoch", flush=True)
+    ddp_model.train()
+    steps, timed_steps, timed_start = 0, 0, None
+    for epoch in range(start_epoch, args.epochs):
+        running_loss, batches = 0.0, start_batch
+        for inputs, targets in epoch_batches(loader, epoch, start_batch):
+            if steps == args.warmup:
+                timed_start = time.perf_counter()
+            optimizer.zero_grad()
+            with autocast('cpu', bf16):
+                outputs = ddp_model(inputs)
+            loss = policy_loss(outputs, targets)
+            loss.backward()
+            optimizer.step()
+            steps += 1
+            timed_steps += steps > args.warmup
+            running_loss += loss.item()
+            batches += 1
+            # Ranks train in lockstep, so rank 0's checkpoint holds every rank's position
+            if checkpointer and rank == 0:
+                checkpointer.end_batch(model, optimizer, None, epoch, batches)
+            if args.steps and steps >= args.steps:
+                break
+        start_batch = 0
+        if rank == 0 and batches:
+            print(f"Epoch {epoch + 1}, Train Loss: {running_loss / batches:.4f}", flush=True)
+        if args.steps and steps >= args.steps:
+            break
+        if checkpointer and rank == 0:
+            checkpointer.save(model, optimizer, None, epoch + 1, 0)
+
+    elapsed = time.perf_counter() - timed_start if timed_start else 0.0
+    if rank == 0:
+        if checkpointer:
+            checkpointer.close()
+        if args.output:
+            torch.save(model.state_dict(), args.output)
+        results.put((timed_steps * args.batch_size * world_size, elapsed, threads))
+    if world_size > 1:
+        dist.destroy_process_group()
+
+def train(args, processes):
+    """Trains with `processes` local processes; returns (samples timed, seconds, threads per process)."""
+    results = mp.get_context('spawn').SimpleQueue()
+    if processes == 1:
+        _worker(0, 1, args, None, results)
+    else:
+        mp.spawn(_worker, args=(processes, args, _free_port(), results), nprocs=processes, join=True)
+    return results.get()
+
+def scaling_report(args, max_processes):
+    counts = sorted({2 ** k for k in range(max_processes.bit_length()) if 2 ** k <= max_processes} | {max_processes})
+    rows = []
+    for processes in counts:
+        samples, elapsed, threads = train(args, processes)
+        rows.append((processes, threads, samples / elapsed if elapsed else 0.0))
+    base = rows[0][2]
+    print(f"{'processes':>9} {'threads':>7} {'samples/s':>10} {'speedup':>8} {'efficiency':>10}")
+    for processes, threads, rate in rows:
+        speedup = rate / base if base else 0.0
+        print(f"{processes:>9} {threads:>7} {rate:>10.0f} {speedup:>7.2f}x {100 * speedup / processes:>9.0f}%")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train ChessNet on CPU, optionally data-parallel over local processes.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('train', "train with --processes processes"), ('scale', "throughput from 1 to --max-processes processes")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('shards', nargs='?', default=None, help="shard directory from build_shards; synthetic data if omitted")
+        command.add_argument('--synthetic', type=int, default=100000, help="synthetic samples when no shards are given")
+        command.add_argument('--batch-size', type=int, default=32, help="per process")
+        command.add_argument('--lr', type=float, default=1e-4)
+        command.add_argument('--workers', type=int, default=0, help="DataLoader workers per process")
+        command.add_argument('--seed', type=int, default=0)
+        bf16 = command.add_mutually_exclusive_group()
+        bf16.add_argument('--bf16', dest='bf16', action='store_true', default=None)
+        bf16.add_argument('--no-bf16', dest='bf16', action='store_false')
+    train_command, scale_command = commands.choices['train'], commands.choices['scale']
+    train_command.add_argument('--processes', type=int, default=1)
+    train_command.add_argument('--epochs', type=int, default=1)
+    train_command.add_argument('--steps', type=int, default=None, help="stop after this many steps")
+    train_command.add_argument('--warmup', type=int, default=0)
+    train_command.add_argument('--checkpoint-dir', default=None)
+    train_command.add_argument('--checkpoint-every', type=int, default=2000)
+    train_command.add_argument('-o', '--output', default=None, help="save the trained state dict here")
+    scale_command.add_argument('--max-processes', type=int, default=os.cpu_count())
+    scale_command.add_argument('--steps', type=int, default=50)
+    scale_command.add_argument('--warmup', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        samples, elapsed, _ = train(args, args.processes)
+        if elapsed:
+            print(f"{samples / elapsed:.0f} samples/s")
+    else:
+        args.epochs, args.checkpoint_dir, args.output = 1, None, None
+        scaling_report(args, args.max_processes)
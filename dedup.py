@@ -0,0 +1,149 @@
+"""
+Deduplication of CNN training shards.
+
+Opening positions occur in a large share of all games, so the shards from build_shards hold the same few
+positions (and usually the same few replies) many thousands of times. dedup_shards collapses the samples to
+one per (position, move played) pair, stores how often the pair occurred as the sample's weight and caps the
+total weight of any single position, spreading the cap over its moves in proportion to their counts. Training
+then samples by weight (ResumableSampler(weights=ShardDataset.weights)).
+
+Positions are identified by their polyglot Zobrist key, computed for whole arrays of packed records at once.
+The corpus never has to fit in memory: samples are first spilled to hash-partitioned files by key, so every
+occurrence of a position lands in the same partition, and the partitions are then deduplicated one at a time.
+
+    python dedup.py shards/train shards/train-dedup --cap 100 --partitions 64
+"""
+import os
+import glob
+import shutil
+import argparse
+import numpy as np
+import chess
+import chess.polyglot
+from packed import RECORD_SIZE, NO_EP, square_codes
+from shard_writer import ShardWriter
+
+_RANDOM = np.array(chess.polyglot.POLYGLOT_RANDOM_ARRAY, dtype=np.uint64)
+
+# Polyglot key of every (nibble code, square); polyglot numbers pieces black pawn, white pawn, black knight, ...
+_PIECE_KEYS = np.zeros((16, 64), dtype=np.uint64)
+for _piece_type in chess.PIECE_TYPES:
+    _PIECE_KEYS[_piece_type] = _RANDOM[64 * (2 * (_piece_type - 1) + 1):][:64]
+    _PIECE_KEYS[8 | _piece_type] = _RANDOM[64 * 2 * (_piece_type - 1):][:64]
+
+# Castling flags of byte 32 (bits 1-4 = K, Q, k, q) -> xor of their keys
+_CASTLING_KEYS = np.zeros(16, dtype=np.uint64)
+for _flags in range(16):
+    for _bit in range(4):
+        if _flags & (1 << _bit):
+            _CASTLING_KEYS[_flags] ^= _RANDOM[768 + _bit]
+
+SPILL_DTYPE = np.dtype([('key', '<u8'), ('from', 'u1'), ('to', 'u1'), ('pos', 'u1', RECORD_SIZE)])
+
+def zobrist_keys(records):
+    """(N, 34) packed records -> (N,) uint64 keys, equal to chess.polyglot.zobrist_hash of the decoded boards."""
+    records = np.asarray(records, dtype=np.uint8)
+    codes = square_codes(records)
+    keys = np.bitwise_xor.reduce(_PIECE_KEYS[codes, np.arange(64)], axis=1)
+    white = (records[:, 32] & 1).astype(np.bool_)
+    keys ^= _CASTLING_KEYS[(records[:, 32] >> 1) & 15]
+    keys[white] ^= _RANDOM[780]
+    # Like polyglot, the en passant file only counts when a pawn of the side to move stands next to the target
+    ep = records[:, 33].astype(np.int64)
+    rows = np.flatnonzero(ep != NO_EP)
+    if len(rows):
+        target = ep[rows]
+        file = target & 7
+        behind = np.where(white[rows], target - 8, target + 8)
+        pawn = np.where(white[rows], chess.PAWN, 8 | chess.PAWN)
+        left = (file > 0) & (codes[rows, np.clip(behind - 1, 0, 63)] == pawn)
+        right = (file < 7) & (codes[rows, np.clip(behind + 1, 0, 63)] == pawn)
+        hashed = left | right
+        keys[rows[hashed]] ^= _RANDOM[772 + file[hashed]]
+    return keys
+
+def _spill(shard_dir, spill_dir, partitions):
+    """Pass 1: appends every sample, with its key, to the spill file of partition key % partitions."""
+    os.makedirs(spill_dir, exist_ok=True)
+    files = [open(os.path.join(spill_dir, f'part_{i:04d}.bin'), 'wb') for i in range(partitions)]
+    total = 0
+    try:
+        for path in sorted(glob.glob(os.path.join(shard_dir, 'pos_*.npy'))):
+            suffix = os.path.basename(path)[len('pos_'):]
+            positions = np.load(path, mmap_mode='r')
+            froms = np.load(os.path.join(shard_dir, 'from_' + suffix), mmap_mode='r')
+            tos = np.load(os.path.join(shard_dir, 'to_' + suffix), mmap_mode='r')
+            for start in range(0, len(positions), 1_000_000):
+                block = slice(start, start + 1_000_000)
+                rows = np.empty(len(positions[block]), dtype=SPILL_DTYPE)
+                rows['pos'] = positions[block]
+                rows['from'] = froms[block]
+                rows['to'] = tos[block]
+                rows['key'] = zobrist_keys(rows['pos'])
+                part = (rows['key'] % np.uint64(partitions)).astype(np.int64)
+                order = np.argsort(part, kind='stable')
+                bounds = np.searchsorted(part[order], np.arange(partitions + 1))
+                for i in range(partitions):
+                    if bounds[i] < bounds[i + 1]:
+                        rows[order[bounds[i]:bounds[i + 1]]].tofile(files[i])
+                total += len(rows)
+    finally:
+        for f in files:
+            f.close()
+    return total
+
+def _dedup_partition(rows, cap):
+    """Pass 2 for one partition: unique (key, from, to) samples, their weights, and the number of distinct positions."""
+    order = np.lexsort((rows['to'], rows['from'], rows['key']))
+    rows = rows[order]
+    new_sample = np.ones(len(rows), dtype=np.bool_)
+    new_sample[1:] = (rows['key'][1:] != rows['key'][:-1]) | (rows['from'][1:] != rows['from'][:-1]) | \
+        (rows['to'][1:] != rows['to'][:-1])
+    starts = np.flatnonzero(new_sample)
+    counts = np.diff(np.append(starts, len(rows))).astype(np.float64)
+    unique = rows[starts]
+    # Per-position totals over all moves played from it
+    new_position = np.ones(len(unique), dtype=np.bool_)
+    new_position[1:] = unique['key'][1:] != unique['key'][:-1]
+    position = np.cumsum(new_position) - 1
+    totals = np.bincount(position, weights=counts)
+    weights = counts
+    if cap is not None:
+        weights = counts * np.minimum(1.0, cap / totals)[position]
+    return unique, weights.astype(np.float32), len(totals), int(np.count_nonzero(totals > cap)) if cap is not None else 0
+
+def dedup_shards(shard_dir, out_dir, cap=100, partitions=64, shard_size=1_000_000):
+    """
+    Writes the deduplicated samples of shard_dir to out_dir as shards with an extra weight_*.npy per shard.
+    A position seen more than `cap` times keeps a total weight of `cap` (None keeps the raw counts).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    spill_dir = os.path.join(out_dir, 'spill')
+    total = _spill(shard_dir, spill_dir, partitions)
+    writer = ShardWriter(out_dir, shard_size, kinds=('pos', 'from', 'to', 'weight'))
+    positions = capped = 0
+    for i in range(partitions):
+        path = os.path.join(spill_dir, f'part_{i:04d}.bin')
+        rows = np.fromfile(path, dtype=SPILL_DTYPE)
+        os.remove(path)
+        if not len(rows):
+            continue
+        unique, weights, partition_positions, partition_capped = _dedup_partition(rows, cap)
+        # Partitions come out in key order, not game order; ResumableSampler shuffles anyway
+        writer.write((unique['pos'], unique['from'], unique['to'], weights))
+        positions += partition_positions
+        capped += partition_capped
+    writer.close()
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    print(f'{total} samples -> {writer.total} unique (position, move) samples over {positions} positions'
+          + (f'; {capped} positions capped at {cap}' if cap is not None else ''))
+    return writer.total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate training shards by (Zobrist key, move) with frequency weights.")
+    parser.add_argument('shards', help="shard directory written by build_shards")
+    parser.add_argument('output', help="directory for the deduplicated shards")
+    parser.add_argument('--cap', type=float, default=100, help="maximum total weight of one position; 0 for no cap")
+    parser.add_argument('--partitions', type=int, default=64, help="spill partitions; each must fit in memory")
+    args = parser.parse_args()
+    dedup_shards(args.shards, args.output, args.cap or None, args.partitions)
@@ -0,0 +1,347 @@
+"""
+The alpha-beta engine played by v3.py and v3eval.py and measured by headless.py: the piece-square evaluation
+with its bitbase, Syzygy, value-network and NNUE hooks, and minimax with optional CNN move ordering and the
+batched depth-1 frontier. Each script builds its engine with load_engine(); the tables and the search live here
+only, so a match in headless.py plays exactly what the GUI plays.
+"""
+import os
+import functools
+import chess
+import chess.polyglot
+from evalcache import EvalCache
+from tablebases import TablebaseProber
+from bitbase import Bitbases
+from valuenet import NumpyValueNet
+from nnue import NNUE, NNUEBoard
+from board_rep import board_bitboards
+from batch_eval import PSTBatchEvaluator
+
+MAX, MIN = 10000, -10000
+
+
+piece_square_table = {
+    chess.PAWN: [
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5,  5, 10, 25, 25, 10,  5,  5],
+        [0,  0,  0, 20, 20,  0,  0,  0],
+        [5, -5,-10,  0,  0,-10, -5,  5],
+        [5, 10, 10,-20,-20, 10, 10,  5],
+        [0,  0,  0,  0,  0,  0,  0,  0]
+    ],
+    chess.KNIGHT: [
+        [-50,-40,-30,-30,-30,-30,-40,-50],
+        [-40,-20,  0,  0,  0,  0,-20,-40],
+        [-30,  0, 10, 15, 15, 10,  0,-30],
+        [-30,  5, 15, 20, 20, 15,  5,-30],
+        [-30,  0, 15, 20, 20, 15,  0,-30],
+        [-30,  5, 10, 15, 15, 10,  5,-30],
+        [-40,-20,  0,  5,  5,  0,-20,-40],
+        [-50,-40,-30,-30,-30,-30,-40,-50]
+    ],
+    chess.BISHOP: [
+        [-20,-10,-10,-10,-10,-10,-10,-20],
+        [-10,  0,  0,  0,  0,  0,  0,-10],
+        [-10,  0,  5, 10, 10,  5,  0,-10],
+        [-10,  5,  5, 10, 10,  5,  5,-10],
+        [-10,  0, 10, 10, 10, 10,  0,-10],
+        [-10, 10, 10, 10, 10, 10, 10,-10],
+        [-10,  5,  0,  0,  0,  0,  5,-10],
+        [-20,-10,-10,-10,-10,-10,-10,-20]
+    ],
+    chess.ROOK: [
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [5, 10, 10, 10, 10, 10, 10,  5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [0,  0,  0,  5,  5,  0,  0,  0]
+    ],
+    chess.QUEEN: [
+        [-20,-10,-10, -5, -5,-10,-10,-20],
+        [-10,  0,  0,  0,  0,  0,  0,-10],
+        [-10,  0,  5,  5,  5,  5,  0,-10],
+        [-5,  0,  5,  5,  5,  5,  0, -5],
+        [0,  0,  5,  5,  5,  5,  0, -5],
+        [-10,  5,  5,  5,  5,  5,  0,-10],
+        [-10,  0,  5,  0,  0,  0,  0,-10],
+        [-20,-10,-10, -5, -5,-10,-10,-20]
+    ],
+    chess.KING: [
+        [-30,-40,-40,-50,-50,-40,-40,-30],
+        [-30,-40,-40,-50,-50,-40,-40,-30],
+        [-30,-40,-40,-50,-50,-40,-40,-30],
+        [-30,-40,-40,-50,-50,-40,-40,-30],
+        [-20,-30,-30,-40,-40,-30,-30,-20],
+        [-10,-20,-20,-20,-20,-20,-20,-10],
+        [20, 20,  0,  0,  0,  0, 20, 20],
+        [20, 30, 10,  0,  0, 10, 30, 20]
+    ]
+}
+
+piece_values = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 20000
+}
+
+def get_piece_value(piece, values=piece_values):
+    return values[piece.piece_type] if piece.color == chess.WHITE else -values[piece.piece_type]
+
+def static_evaluation(board, values=piece_values):
+    """Material, piece-square and endgame pawn terms, from White's point of view."""
+    material = sum(get_piece_value(piece, values) for piece in board.piece_map().values())
+    positional = sum(piece_square_table[piece.piece_type][square // 8][square % 8] * (1 if piece.color == chess.WHITE else -1) for square, piece in board.piece_map().items())
+
+    # Add a bonus for pawn advancement in the endgame
+    if len(board.piece_map()) <= 10:  # Endgame condition
+        pawn_bonus = 0
+        for square, piece in board.piece_map().items():
+            if piece.piece_type == chess.PAWN:
+                rank = chess.square_rank(square)
+                if piece.color == chess.WHITE:
+                    pawn_bonus += (rank * 10)  # Reward for advancing pawns
+                else:
+                    pawn_bonus -= ((7 - rank) * 10)
+        return material + positional + pawn_bonus
+
+    return material + positional
+
+def order_moves(board):
+    """
+    Order the moves based on their priority: captures, checks, promotions, and then quiet moves.
+    """
+    move_scores = []
+    for move in board.legal_moves:
+        if board.gives_check(move):
+            score = 50  # Arbitrary score for checks
+        elif move.promotion:
+            score = 75  # Arbitrary score for promotions
+        else:
+            score = 10  # Lower score for quiet moves
+        move_scores.append((score, move))
+
+    # Sort moves by their scores in descending order
+    move_scores.sort(reverse=True, key=lambda x: x[0])
+    ordered_moves = [move for score, move in move_scores]
+
+    return ordered_moves
+
+class Engine:
+    """
+    Evaluation and search state of one engine configuration.
+    tablebase / bitbases / value_net / nnue are the loaded components (None disables a hook); move_orderer is an
+    optional PolicyOrderer; order_moves orders the plies the policy does not (legal move order by default).
+    """
+    def __init__(self, piece_values=piece_values, tablebase=None, bitbases=None, value_net=None, nnue=None,
+                 move_orderer=None, order_moves=None, eval_cache=None):
+        self.piece_values = piece_values
+        self.tablebase = tablebase
+        self.bitbases = bitbases
+        self.value_net = value_net
+        self.nnue = nnue
+        self.move_orderer = move_orderer
+        self.order_moves = order_moves
+        # Static evals are reused across sibling subtrees and across moves of the game
+        self.eval_cache = eval_cache if eval_cache is not None else EvalCache()
+        # Vectorized material + piece-square evaluation, used for the batched frontier
+        self.pst_batch = PSTBatchEvaluator(piece_square_table, piece_values)
+        # Evaluate all children of a depth-1 node with one vectorized call instead of one evaluate_board call per
+        # leaf (not with the NNUE, whose incremental updates already make single evaluations cheap)
+        self.batch_leaves = True
+        self.frontier_chunk = 2
+        self.search_stats = {'nodes': 0, 'leaves': 0, 'cutoffs': 0, 'first_move_cutoffs': 0, 'policy_cutoffs': 0, 'policy_first_move_cutoffs': 0}
+
+    def fork(self, move_orderer=None):
+        """Another configuration sharing the loaded tables and networks, with its own cache, statistics and ordering."""
+        return Engine(self.piece_values, self.tablebase, self.bitbases, self.value_net, self.nnue,
+                      move_orderer, self.order_moves)
+
+    def new_board(self, board=None):
+        """A game board for this engine (an NNUEBoard when the NNUE is loaded), optionally continuing `board`."""
+        if self.nnue is None:
+            return board.copy() if board is not None else chess.Board()
+        if board is None:
+            return NNUEBoard(nnue=self.nnue)
+        new = NNUEBoard(board.root().fen(), nnue=self.nnue)
+        for move in board.move_stack:
+            new.push(move)
+        return new
+
+    def evaluate_board(self, board):
+        if board.is_checkmate():
+            return MIN if board.turn else MAX
+
+        # Small endgames are looked up in the bitbases
+        bitbase_result = self.bitbases.probe(board) if self.bitbases is not None else None
+        if bitbase_result is not None:
+            wdl, plies = bitbase_result
+            score = 0 if wdl == 0 else MAX - plies  # Prefer the quickest mate
+            return score if (wdl > 0) == (board.turn == chess.WHITE) else -score
+
+        # Check for endgame using Syzygy tablebases
+        wdl = self.tablebase.probe_wdl(board) if self.tablebase is not None else None
+        if wdl is not None:
+            # WDL is from the side to move, the evaluation is from White's point of view
+            return (wdl if board.turn == chess.WHITE else -wdl) * MAX  # Scale the WDL result to a large value
+
+        if self.nnue is not None:
+            return self.nnue.evaluate(board)
+        if self.value_net is not None:
+            return self.value_net.evaluate(board)
+        return static_evaluation(board, self.piece_values)
+
+    def record_cutoff(self, move_index, policy_ordered):
+        prefix = 'policy_' if policy_ordered else ''
+        self.search_stats[prefix + 'cutoffs'] += 1
+        if move_index == 0:
+            self.search_stats[prefix + 'first_move_cutoffs'] += 1
+
+    def first_move_cutoff_rate(self, prefix=''):
+        cutoffs = self.search_stats[prefix + 'cutoffs']
+        return 100 * self.search_stats[prefix + 'first_move_cutoffs'] / cutoffs if cutoffs else 0
+
+    def print_search_stats(self):
+        stats = self.search_stats
+        total_cutoffs = stats['cutoffs'] + stats['policy_cutoffs']
+        total_first = stats['first_move_cutoffs'] + stats['policy_first_move_cutoffs']
+        components = [str(component) for component in (self.move_orderer, self.eval_cache, self.tablebase) if component is not None]
+        print(f"Search: {stats['nodes']} nodes, {stats['leaves']} leaves, "
+              f"first-move cutoffs {100 * total_first / total_cutoffs if total_cutoffs else 0:.0f}% "
+              f"(policy-ordered {self.first_move_cutoff_rate('policy_'):.0f}%, other {self.first_move_cutoff_rate():.0f}%), "
+              + ", ".join(components))
+        for key in stats:
+            stats[key] = 0
+        for component in (self.eval_cache, self.tablebase, self.move_orderer):
+            if component is not None:
+                component.reset_stats()
+
+    def evaluate_frontier(self, board, moves):
+        """Static evaluations of the positions after each move; the uncached ones are computed in one batch."""
+        values = [None] * len(moves)
+        pending, keys, bitboards, turns = [], [], [], []
+        # Mates and tablebase-sized endgames keep going through evaluate_board
+        special_pieces = max(self.bitbases.max_pieces if self.bitbases is not None else 0,
+                             self.tablebase.max_pieces if self.tablebase is not None else 0)
+        for i, move in enumerate(moves):
+            board.push(move)
+            key = chess.polyglot.zobrist_hash(board)
+            value = self.eval_cache.get(key)
+            if value is None and (chess.popcount(board.occupied) <= special_pieces or board.is_checkmate()):
+                value = self.evaluate_board(board)
+                self.eval_cache.put(key, value)
+            if value is None:
+                pending.append(i)
+                keys.append(key)
+                bitboards.append(board_bitboards(board))
+                turns.append(board.turn == chess.WHITE)
+            values[i] = value
+            board.pop()
+        if pending:
+            batch = self.value_net.evaluate_bitboards(bitboards, turns) if self.value_net is not None else self.pst_batch(bitboards)
+            for i, key, value in zip(pending, keys, batch):
+                values[i] = float(value)
+                self.eval_cache.put(key, values[i])
+        return values
+
+    def resolve_frontier(self, board, moves, maximizingPlayer, alpha, beta, policy_ordered):
+        """
+        minimax at depth 1 with the leaves evaluated by evaluate_frontier, in chunks of growing size (2, 4, 8, ...)
+        so that an early cutoff still skips most of the siblings.
+        """
+        best = MIN if maximizingPlayer else MAX
+        best_move = None
+        start, size = 0, self.frontier_chunk
+        while start < len(moves):
+            chunk = moves[start:start + size]
+            values = self.evaluate_frontier(board, chunk)
+            self.search_stats['nodes'] += len(chunk)
+            self.search_stats['leaves'] += len(chunk)
+            for i, (move, val) in enumerate(zip(chunk, values), start):
+                if maximizingPlayer:
+                    if val > best:
+                        best = val
+                        best_move = move
+                    alpha = max(alpha, best)
+                else:
+                    if val < best:
+                        best = val
+                        best_move = move
+                    beta = min(beta, best)
+                if beta <= alpha:
+                    self.record_cutoff(i, policy_ordered)
+                    return best, best_move
+            start += size
+            size *= 2
+        return best, best_move
+
+    def minimax(self, depth, maximizingPlayer, alpha, beta, board, ply=0):
+        self.search_stats['nodes'] += 1
+        if depth == 0 or board.is_game_over():
+            self.search_stats['leaves'] += 1
+            eval_value = self.eval_cache.probe(board, self.evaluate_board)
+            return eval_value, None
+
+        best_move = None
+        policy_ordered = self.move_orderer is not None and self.move_orderer.active(ply)
+        if policy_ordered:
+            moves = self.move_orderer.order(board, ply)
+        else:
+            moves = self.order_moves(board) if self.order_moves is not None else board.legal_moves
+        if depth == 1 and self.batch_leaves and self.nnue is None:
+            return self.resolve_frontier(board, list(moves), maximizingPlayer, alpha, beta, policy_ordered)
+
+        if maximizingPlayer:
+            best = MIN
+            for i, move in enumerate(moves):
+                board.push(move)
+                val, _ = self.minimax(depth - 1, False, alpha, beta, board, ply + 1)
+                board.pop()
+                if val > best:
+                    best = val
+                    best_move = move
+                alpha = max(alpha, best)
+                if beta <= alpha:
+                    self.record_cutoff(i, policy_ordered)
+                    break
+        else:
+            best = MAX
+            for i, move in enumerate(moves):
+                board.push(move)
+                val, _ = self.minimax(depth - 1, True, alpha, beta, board, ply + 1)
+                board.pop()
+                if val < best:
+                    best = val
+                    best_move = move
+                beta = min(beta, best)
+                if beta <= alpha:
+                    self.record_cutoff(i, policy_ordered)
+                    break
+        return best, best_move
+
+def load_engine(piece_values=piece_values, move_orderer=None, order_moves=None,
+                syzygy_directory=os.environ.get('SYZYGY_PATH', 'syzygy'), bitbase_directory='bitbases',
+                value_net_path='value_net.npz', nnue_path='nnue.npz'):
+    """
+    Opens the engine's tables and networks: Syzygy tablebases (point SYZYGY_PATH at the .rtbw/.rtbz files), the
+    KQK/KRK/KPK/KBNK bitbases from `python bitbase.py`, the value network from `python valuenet.py train` and
+    the NNUE from `python nnue.py train`. A missing file or a None path disables that hook.
+    """
+    value_net = NumpyValueNet(value_net_path) if value_net_path and os.path.exists(value_net_path) else None
+    nnue = NNUE(nnue_path) if nnue_path and os.path.exists(nnue_path) else None
+    return Engine(piece_values, TablebaseProber(syzygy_directory), Bitbases(bitbase_directory), value_net, nnue,
+                  move_orderer, order_moves)
+
+@functools.lru_cache(maxsize=None)
+def reference_engine():
+    """
+    The engine's hand-written evaluation (tables, bitbases and Syzygy, no networks), opened once per process.
+    Training labels for the value network and the NNUE come from here, so they never depend on a network.
+    """
+    return load_engine(value_net_path=None, nnue_path=None)
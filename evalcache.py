@@ -0,0 +1,71 @@
+import chess
+import chess.polyglot
+import numpy as np
+
+class EvalCache:
+    """
+    Fixed-size, direct-mapped table from Zobrist key to static evaluation.
+    Each key maps to exactly one slot (key & mask); a newer entry simply overwrites an older one.
+    """
+    def __init__(self, size_bits=20):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.keys = np.zeros(self.size, dtype=np.uint64)
+        self.values = np.zeros(self.size, dtype=np.float64)
+        self.used = np.zeros(self.size, dtype=np.bool_)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        slot = key & self.mask
+        if self.used[slot] and self.keys[slot] == key:
+            self.hits += 1
+            return float(self.values[slot])
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        slot = key & self.mask
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.used[slot] = True
+
+    def probe(self, board, evaluate):
+        key = chess.polyglot.zobrist_hash(board)
+        value = self.get(key)
+        if value is None:
+            value = evaluate(board)
+            self.put(key, value)
+        return value
+
+    def wrap(self, evaluate):
+        # Works for any evaluator taking a board: v3 evaluate_board, PeSTO, the NN value function, ...
+        def cached_evaluate(board):
+            return self.probe(board, evaluate)
+        return cached_evaluate
+
+    def clear(self):
+        self.used[:] = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def memory_bytes(self):
+        return self.keys.nbytes + self.values.nbytes + self.used.nbytes
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'filled': int(np.count_nonzero(self.used)),
+            'entries': self.size,
+            'memory_mb': self.memory_bytes() / (1 << 20),
+        }
+
+    def __str__(self):
+        s = self.stats()
+        return f"eval cache {s['hits']}/{s['hits'] + s['misses']} hits ({s['hit_rate']:.1%}), {s['filled']}/{s['entries']} slots, {s['memory_mb']:.1f} MB"
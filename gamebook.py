@@ -0,0 +1,187 @@
+"""
+Builds a polyglot opening book from the Kaggle chess_games.csv corpus (the one cnn.ipynb trains on).
+
+The CSV is streamed in chunks, games are replayed to a fixed ply depth by a pool of worker processes,
+and (zobrist key, move) statistics are aggregated in memory until the buffer is full. Full buffers are
+spilled to disk as sorted runs, which are merged at the end, so memory stays bounded however many games
+the corpus has.
+
+    python gamebook.py chess_games.csv -o games-book.bin --plies 20 --min-elo 2000
+
+The output is a regular polyglot book: list it in polyglot_filenames or merge it with `python book.py`.
+"""
+import os
+import re
+import heapq
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+import chess
+import chess.polyglot
+from book import ENTRY_DTYPE, encode_move
+
+RUN_DTYPE = np.dtype([('key', '<u8'), ('move', '<u2'), ('games', '<u4'), ('wins', '<u4'), ('draws', '<u4')])
+
+# Points for the side that made the move
+RESULTS = {'1-0': (1, 0), '0-1': (0, 1), '1/2-1/2': (0.5, 0.5)}
+
+def create_move_list(s):
+    return re.sub(r'\d*\. ', '', s).split(' ')[:-1]
+
+def _aggregate(keys, moves, games, wins, draws):
+    """Sums the statistics of equal (key, move) pairs; returns a RUN_DTYPE array sorted by key and move."""
+    runs = np.zeros(len(keys), dtype=RUN_DTYPE)
+    if not len(keys):
+        return runs
+    order = np.lexsort((moves, keys))
+    keys, moves = keys[order], moves[order]
+    starts = np.flatnonzero(np.concatenate([[True], (keys[1:] != keys[:-1]) | (moves[1:] != moves[:-1])]))
+    runs = runs[:len(starts)]
+    runs['key'] = keys[starts]
+    runs['move'] = moves[starts]
+    runs['games'] = np.add.reduceat(games[order], starts)
+    runs['wins'] = np.add.reduceat(wins[order], starts)
+    runs['draws'] = np.add.reduceat(draws[order], starts)
+    return runs
+
+def replay_games(games, plies):
+    """Worker: replays (AN, Result) pairs to `plies` half-moves and returns their aggregated statistics."""
+    keys, moves, wins, draws = [], [], [], []
+    for an, result in games:
+        points = RESULTS.get(result)
+        if points is None:
+            continue
+        board = chess.Board()
+        try:
+            for san in create_move_list(an)[:plies]:
+                move = board.parse_san(san)
+                score = points[0] if board.turn == chess.WHITE else points[1]
+                keys.append(chess.polyglot.zobrist_hash(board))
+                moves.append(encode_move(board, move))
+                wins.append(score == 1)
+                draws.append(score == 0.5)
+                board.push(move)
+        except ValueError:
+            continue  # Corrupt move text; keep what was replayed so far
+    count = len(keys)
+    return _aggregate(np.array(keys, dtype=np.uint64), np.array(moves, dtype=np.uint16),
+                      np.ones(count, dtype=np.uint32), np.array(wins, dtype=np.uint32), np.array(draws, dtype=np.uint32))
+
+def _read_games(csv_path, chunk_size, min_elo, max_games):
+    """Yields lists of (AN, Result) with the notebook's filters, chunk by chunk."""
+    seen = 0
+    for chunk in pd.read_csv(csv_path, usecols=['AN', 'Result', 'WhiteElo', 'BlackElo'], chunksize=chunk_size):
+        chunk = chunk[(chunk['WhiteElo'] >= min_elo) & (chunk['BlackElo'] >= min_elo)]
+        chunk = chunk[~chunk['AN'].str.contains('{', regex=False) & (chunk['AN'].str.len() > 20)]
+        if max_games is not None:
+            chunk = chunk.iloc[:max_games - seen]
+        seen += len(chunk)
+        yield list(zip(chunk['AN'], chunk['Result']))
+        if max_games is not None and seen >= max_games:
+            return
+
+def _iter_run(path, block=1 << 16):
+    run = np.load(path, mmap_mode='r')
+    for start in range(0, len(run), block):
+        yield from run[start:start + block].tolist()
+
+def _spill(parts, directory, index):
+    merged = np.concatenate(parts)
+    merged = _aggregate(merged['key'], merged['move'], merged['games'], merged['wins'], merged['draws'])
+    path = os.path.join(directory, f'run{index:05d}.npy')
+    np.save(path, merged)
+    return path
+
+def _position_entries(key, stats, min_games, min_score, weighting):
+    """Turns the {move: [games, wins, draws]} of one position into book entries."""
+    entries = []
+    for move, (games, wins, draws) in stats.items():
+        score = (wins + 0.5 * draws) / games
+        if games < min_games or score < min_score:
+            continue
+        weight = games if weighting == 'games' else 2 * wins + draws
+        if weight > 0:
+            entries.append((key, move, weight))
+    if entries:
+        # Keep the most played move at 65535 when counts overflow 16 bits
+        top = max(weight for _, _, weight in entries)
+        scale = min(1.0, 0xffff / top)
+        entries = [(key, move, max(1, int(weight * scale))) for key, move, weight in entries]
+        entries.sort(key=lambda entry: -entry[2])
+    return entries
+
+def build_book(csv_path, output, plies=20, min_elo=0, min_games=1, min_score=0.0, weighting='score',
+               processes=None, chunk_size=20000, buffer_entries=5_000_000, max_games=None, tmp_dir=None):
+    run_dir = tempfile.mkdtemp(prefix='gamebook-', dir=tmp_dir)
+    runs, parts, buffered, games = [], [], 0, 0
+    try:
+        with multiprocessing.Pool(processes) as pool:
+            for chunk in _read_games(csv_path, chunk_size, min_elo, max_games):
+                # Split each CSV chunk so every worker gets a share of it
+                step = max(1, len(chunk) // (4 * (processes or os.cpu_count() or 1)))
+                batches = [chunk[i:i + step] for i in range(0, len(chunk), step)]
+                for part in pool.imap_unordered(_replay_batch, [(batch, plies) for batch in batches]):
+                    parts.append(part)
+                    buffered += len(part)
+                games += len(chunk)
+                if buffered >= buffer_entries:
+                    runs.append(_spill(parts, run_dir, len(runs)))
+                    parts, buffered = [], 0
+                print(f"{games} games replayed, {len(runs)} runs spilled")
+        if parts:
+            runs.append(_spill(parts, run_dir, len(runs)))
+
+        written = 0
+        with open(output, 'wb') as f:
+            out = []
+            current, stats = None, {}
+            for key, move, g, w, d in heapq.merge(*[_iter_run(path) for path in runs]):
+                if key != current:
+                    out.extend(_position_entries(current, stats, min_games, min_score, weighting))
+                    current, stats = key, {}
+                    if len(out) >= 1 << 16:
+                        written += _write_entries(f, out)
+                        out = []
+                total = stats.setdefault(move, [0, 0, 0])
+                total[0] += g
+                total[1] += w
+                total[2] += d
+            out.extend(_position_entries(current, stats, min_games, min_score, weighting))
+            written += _write_entries(f, out)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    print(f"Wrote {written} entries from {games} games to {output}")
+    return written
+
+def _replay_batch(args):
+    return replay_games(*args)
+
+def _write_entries(f, entries):
+    block = np.zeros(len(entries), dtype=ENTRY_DTYPE)
+    if entries:
+        keys, moves, weights = zip(*entries)
+        block['key'] = keys
+        block['move'] = moves
+        block['weight'] = weights
+    block.tofile(f)
+    return len(block)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a polyglot book from chess_games.csv.")
+    parser.add_argument('csv', nargs='?', default='chess_games.csv')
+    parser.add_argument('-o', '--output', default='games-book.bin')
+    parser.add_argument('--plies', type=int, default=20, help="replay each game to this many half-moves")
+    parser.add_argument('--min-elo', type=int, default=1600, help="both players must be rated at least this")
+    parser.add_argument('--min-games', type=int, default=5, help="drop moves played fewer times than this")
+    parser.add_argument('--min-score', type=float, default=0.0, help="drop moves scoring below this for the mover")
+    parser.add_argument('--weighting', choices=['score', 'games'], default='score', help="'score' is 2 * wins + draws")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--buffer-entries', type=int, default=5_000_000, help="spill a sorted run to disk above this many entries")
+    parser.add_argument('--max-games', type=int, default=None)
+    args = parser.parse_args()
+    build_book(args.csv, args.output, args.plies, args.min_elo, args.min_games, args.min_score, args.weighting,
+               args.processes, args.chunk_size, args.buffer_entries, args.max_games)
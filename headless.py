@@ -0,0 +1,131 @@
+"""
+Headless engine matches: the engine v3.py plays (engine.py, with its tablebase, bitbase and network hooks)
+without pygame, played against itself under two configurations, e.g. with and without CNN top-K pruning
+near the root.
+
+    python headless.py --model chess_net_cpu.pt --depth 3 --games 40 --top-k 4 8 12 --mass 0.9
+
+Every opening is played twice with colors swapped. The report gives the score and Elo difference of
+each pruned configuration against full-width search with the same policy ordering, along with time and
+nodes per move.
+"""
+import math
+import copy
+import time
+import random
+import argparse
+import chess
+from engine import MAX, MIN, load_engine
+from policy_ordering import PolicyOrderer
+
+class Player:
+    """One engine configuration (engine.Engine, with or without policy ordering and pruning) at a fixed search depth."""
+    def __init__(self, name, depth, engine):
+        self.name = name
+        self.depth = depth
+        self.engine = engine
+        self.nodes = 0
+        self.moves = 0
+        self.time = 0.0
+
+    def choose_move(self, board):
+        start = time.perf_counter()
+        nodes = self.engine.search_stats['nodes']
+        _, move = self.engine.minimax(self.depth, board.turn == chess.WHITE, MIN, MAX, board)
+        self.nodes += self.engine.search_stats['nodes'] - nodes
+        self.time += time.perf_counter() - start
+        self.moves += 1
+        return move or random.choice(list(board.legal_moves))
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.moves = 0
+        self.time = 0.0
+
+def opening_positions(count, plies=4, seed=0):
+    """Distinct start positions after `plies` random moves from the initial position."""
+    rng = random.Random(seed)
+    openings, seen = [], set()
+    while len(openings) < count:
+        board = chess.Board()
+        for _ in range(plies):
+            board.push(rng.choice(list(board.legal_moves)))
+        if board.fen() not in seen:
+            seen.add(board.fen())
+            openings.append(board)
+    return openings
+
+def play_game(white, black, opening, max_plies=200):
+    """Plays out `opening`; returns the result from White's point of view (1, 0.5 or 0). Long games count as draws."""
+    board = white.engine.new_board(opening)
+    while not board.is_game_over(claim_draw=True) and board.ply() < max_plies:
+        player = white if board.turn == chess.WHITE else black
+        board.push(player.choose_move(board))
+    result = board.result(claim_draw=True)
+    return {'1-0': 1.0, '0-1': 0.0}.get(result, 0.5)
+
+def elo_difference(scores):
+    """Elo difference implied by per-game scores, with a 95% error margin."""
+    n = len(scores)
+    score = sum(scores) / n
+    # Keep all-win / all-loss matches finite
+    clamped = min(max(score, 0.5 / n), 1 - 0.5 / n)
+    elo = -400 * math.log10(1 / clamped - 1) + 0.0  # + 0.0 turns -0 into 0
+    deviation = math.sqrt(sum((s - score) ** 2 for s in scores) / n)
+    margin = 1.96 * deviation / math.sqrt(n) * 400 / (math.log(10) * clamped * (1 - clamped))
+    return elo, margin
+
+def match(player, opponent, openings, max_plies=200):
+    """Scores of `player` against `opponent`, each opening played once with either color."""
+    scores = []
+    for i, opening in enumerate(openings):
+        scores.append(play_game(player, opponent, opening, max_plies))
+        scores.append(1 - play_game(opponent, player, opening, max_plies))
+        print(f"  opening {i + 1}/{len(openings)}: {player.name} {sum(scores)}/{len(scores)}")
+    return scores
+
+def pruning_report(engine, depth, games, top_ks, mass=None, max_plies=200, seed=0):
+    """
+    Plays pruned (each K in top_ks) against unpruned search with the same ordering (engine.move_orderer); prints
+    Elo change versus time saved.
+    """
+    orderer = engine.move_orderer
+    openings = opening_positions(max(1, games // 2), seed=seed)
+    baseline = Player('full', depth, engine)
+    rows = []
+    for top_k in top_ks:
+        pruned_orderer = copy.copy(orderer)  # Shares the model and the output cache
+        pruned_orderer.top_k = top_k
+        pruned_orderer.mass = mass
+        pruned = Player(f'top-{top_k}', depth, engine.fork(pruned_orderer))
+        baseline.reset_stats()
+        print(f"{pruned.name} vs {baseline.name}, depth {depth}, {2 * len(openings)} games")
+        scores = match(pruned, baseline, openings, max_plies)
+        elo, margin = elo_difference(scores)
+        ms_pruned = 1000 * pruned.time / max(pruned.moves, 1)
+        ms_full = 1000 * baseline.time / max(baseline.moves, 1)
+        rows.append((top_k, elo, margin, ms_pruned, ms_full, pruned.nodes / max(pruned.moves, 1), baseline.nodes / max(baseline.moves, 1)))
+
+    print(f"\n{'K':>4} {'Elo':>12} {'ms/move':>9} {'full':>9} {'saved':>7} {'nodes/move':>11} {'full':>9}")
+    for top_k, elo, margin, ms_pruned, ms_full, nodes_pruned, nodes_full in rows:
+        print(f"{top_k:>4} {elo:>+6.0f} ±{margin:<4.0f} {ms_pruned:>9.1f} {ms_full:>9.1f} {100 * (1 - ms_pruned / ms_full):>6.0f}% "
+              f"{nodes_pruned:>11.0f} {nodes_full:>9.0f}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Elo change versus time saved by CNN top-K pruning near the root.")
+    parser.add_argument('--model', default='chess_net_cpu.pt', help="CPU export from cnn_export.py")
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--games', type=int, default=40, help="games per K")
+    parser.add_argument('--top-k', type=int, nargs='+', default=[4, 8, 12])
+    parser.add_argument('--mass', type=float, default=None, help="also stop once this much policy mass is covered")
+    parser.add_argument('--policy-plies', type=int, default=2, help="plies ordered by the policy")
+    parser.add_argument('--prune-plies', type=int, default=2, help="plies pruned to the top K")
+    parser.add_argument('--max-plies', type=int, default=200, help="longer games are scored as draws")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    orderer = PolicyOrderer(args.model, max(args.policy_plies, args.prune_plies), prune_plies=args.prune_plies)
+    if orderer.model is None:
+        parser.error(f"{args.model} not found; export one with `python cnn_export.py`")
+    pruning_report(load_engine(move_orderer=orderer), args.depth, args.games, args.top_k, args.mass, args.max_plies, args.seed)
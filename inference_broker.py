@@ -0,0 +1,129 @@
+"""
+In-process micro-batching for ChessNet inference when several games run at once.
+
+Callers submit board tensors and get futures back. A scheduler thread collects requests until it has
+max_batch of them or max_wait_ms has passed, runs a single forward pass and resolves the futures.
+A lone game never waits: the scheduler only holds a batch open when requests were recently arriving
+concurrently.
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+import torch
+
+class InferenceBroker:
+    def __init__(self, model, max_batch=32, max_wait_ms=2.0):
+        """`model` is called with a (N, 6, 8, 8) float tensor and returns N outputs (tensor or array), e.g. CpuPolicy."""
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.served = 0
+        self.last_batch_size = 0
+        self.thread = threading.Thread(target=self._run, name='inference-broker', daemon=True)
+        self.thread.start()
+
+    def submit(self, x):
+        """Queues one board tensor ((6, 8, 8) or (1, 6, 8, 8)); the future resolves to its (1, ...) output."""
+        x = np.asarray(x.cpu() if isinstance(x, torch.Tensor) else x, dtype=np.float32).reshape(1, 6, 8, 8)
+        future = Future()
+        self.requests.put((x, future))
+        return future
+
+    def predict(self, x):
+        """Blocking drop-in for the notebook's predict(x)."""
+        return self.submit(x).result()
+
+    def _collect(self, first):
+        batch = [first]
+        # Take whatever is already waiting without blocking
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        # Only hold the batch open when games are submitting concurrently
+        if len(batch) > 1 or self.last_batch_size > 1:
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.requests.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            stop = any(item is None for item in batch)
+            batch = [item for item in batch if item is not None]
+            try:
+                with torch.inference_mode():
+                    outputs = self.model(torch.from_numpy(np.concatenate([x for x, _ in batch])))
+                if isinstance(outputs, torch.Tensor):
+                    outputs = outputs.cpu().numpy()
+                for i, (_, future) in enumerate(batch):
+                    future.set_result(outputs[i:i + 1])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.served += len(batch)
+            self.last_batch_size = len(batch)
+            if stop:
+                return
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def __str__(self):
+        mean = self.served / self.batches if self.batches else 0
+        return f"broker: {self.served} requests in {self.batches} batches (mean batch {mean:.1f})"
+
+def throughput(model, inputs, clients, broker_kwargs=None):
+    """
+    Positions per second and mean latency (ms) for `clients` threads that each evaluate `inputs` one at a time,
+    through a broker and with direct batch-of-one calls. Returns {'broker': (pos/s, ms), 'direct': (pos/s, ms)}.
+    """
+    results = {}
+    for mode in ('direct', 'broker'):
+        broker = InferenceBroker(model, **(broker_kwargs or {})) if mode == 'broker' else None
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            local = []
+            for x in inputs:
+                start = time.perf_counter()
+                if broker is not None:
+                    broker.predict(x)
+                else:
+                    with torch.inference_mode():
+                        model(torch.as_tensor(x).reshape(1, 6, 8, 8))
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if broker is not None:
+            print(broker)
+            broker.close()
+        results[mode] = (len(latencies) / elapsed, 1000 * sum(latencies) / len(latencies))
+        print(f"{mode:>6}, {clients} clients: {results[mode][0]:.0f} positions/s, {results[mode][1]:.2f} ms mean latency")
+    return results
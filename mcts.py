@@ -0,0 +1,261 @@
+"""
+PUCT Monte-Carlo tree search over ChessNet's policy, an alternative to v3's minimax.
+
+Priors come from the network's from/to output (policy.move_probabilities); leaves are valued by a capture-only
+quiescence search over the engine's evaluation, squashed to [-1, 1], or by any batched value function.
+Virtual loss spreads concurrent descents over different leaves, so each forward pass evaluates a batch of
+leaves at once.
+
+Nodes live in a pool of flat NumPy arrays; the children of a node are a contiguous block, so child selection
+is a handful of vector operations. The tree is kept between moves: the next search starts from the subtree
+of the moves actually played, and the pool is compacted to that subtree when it fills up.
+"""
+import time
+import math
+import numpy as np
+import chess
+from policy import network_planes, move_probabilities
+
+UNEXPANDED, EXPANDED, TERMINAL = 0, 1, 2
+
+def encode_move(move):
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+def decode_move(code):
+    return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+def quiescence(board, alpha, beta, evaluate, depth=4):
+    """Capture-only negamax from the side to move; `evaluate` scores from White's point of view like evaluate_board."""
+    stand_pat = evaluate(board) if board.turn == chess.WHITE else -evaluate(board)
+    if depth == 0 or stand_pat >= beta:
+        return stand_pat
+    alpha = max(alpha, stand_pat)
+    for move in board.generate_legal_captures():
+        board.push(move)
+        score = -quiescence(board, -beta, -alpha, evaluate, depth - 1)
+        board.pop()
+        if score >= beta:
+            return score
+        alpha = max(alpha, score)
+    return alpha
+
+class MCTS:
+    """
+    model: callable on a (N, 6, 8, 8) array returning the (N, 2, 8, 8) policy output, e.g. CpuPolicy.
+    evaluate: static evaluation from White's point of view, used by the quiescence search at leaves.
+    value_fn: optional batched leaf evaluator, boards -> values in [-1, 1] for the side to move; replaces quiescence.
+    """
+    def __init__(self, model, evaluate=None, simulations=800, batch_size=32, c_puct=1.5, virtual_loss=1.0,
+                 capacity=1 << 20, quiescence_depth=4, value_scale=400, value_fn=None):
+        self.model = model
+        self.evaluate = evaluate
+        self.value_fn = value_fn
+        self.simulations = simulations
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self.capacity = capacity
+        self.quiescence_depth = quiescence_depth
+        self.value_scale = value_scale
+
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.child_count = np.zeros(capacity, dtype=np.int16)
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.move = np.zeros(capacity, dtype=np.int32)
+        self.prior = np.zeros(capacity, dtype=np.float32)
+        # Visit counts and value sums include virtual loss while a descent is pending; values are from the
+        # point of view of the player who made the move leading to the node
+        self.visits = np.zeros(capacity, dtype=np.float32)
+        self.value_sum = np.zeros(capacity, dtype=np.float32)
+        self.terminal_value = np.zeros(capacity, dtype=np.float32)
+        self.reset()
+        self.reset_stats()
+
+    def reset(self):
+        """Drops the tree, e.g. for a new game. choose_move also does this when the board is not a continuation."""
+        self.size = 1
+        self.root = 0
+        self.first_child[0] = -1
+        self.child_count[0] = 0
+        self.state[0] = UNEXPANDED
+        self.visits[0] = 0
+        self.value_sum[0] = 0
+        self.root_board = None
+
+    def reset_stats(self):
+        self.simulations_done = 0
+        self.batches = 0
+        self.evaluated = 0
+        self.collisions = 0
+        self.reused = 0
+        self.search_time = 0.0
+        self.inference_time = 0.0
+
+    def _child(self, node, code):
+        start = self.first_child[node]
+        if start < 0:
+            return None
+        matches = np.flatnonzero(self.move[start:start + self.child_count[node]] == code)
+        return start + int(matches[0]) if len(matches) else None
+
+    def _advance(self, board):
+        """Moves the root to `board`, reusing the subtree of the moves played since the last search when possible."""
+        if self.root_board is not None and board.root() == self.root_board.root():
+            played = self.root_board.move_stack
+            if board.move_stack[:len(played)] == played:
+                node = self.root
+                for move in board.move_stack[len(played):]:
+                    node = self._child(node, encode_move(move))
+                    if node is None:
+                        break
+                if node is not None:
+                    self.root = node
+                    self.root_board = board.copy()
+                    self.reused = int(self.visits[node])
+                    if self.size > self.capacity // 2:
+                        self._compact()
+                    return
+        self.reset()
+        self.root_board = board.copy()
+
+    def _compact(self):
+        """Copies the subtree under the root to the front of the pool, keeping every child block contiguous."""
+        order = [self.root]
+        new_first = []
+        i = 0
+        while i < len(order):
+            node = order[i]
+            start = self.first_child[node]
+            if start >= 0:
+                new_first.append(len(order))
+                order.extend(range(start, start + self.child_count[node]))
+            else:
+                new_first.append(-1)
+            i += 1
+        order = np.array(order)
+        count = len(order)
+        for array in (self.child_count, self.state, self.move, self.prior, self.visits, self.value_sum, self.terminal_value):
+            array[:count] = array[order]
+        self.first_child[:count] = new_first
+        self.size = count
+        self.root = 0
+
+    def _select(self):
+        """Descends from the root by PUCT, applying virtual loss; returns the path and the leaf position."""
+        board = self.root_board.copy()
+        node = self.root
+        path = [node]
+        while self.state[node] == EXPANDED:
+            start = self.first_child[node]
+            end = start + self.child_count[node]
+            visits = self.visits[start:end]
+            # Unvisited children take the parent's value (first-play urgency)
+            parent_q = -self.value_sum[node] / self.visits[node] if self.visits[node] > 0 else 0.0
+            q = np.where(visits > 0, self.value_sum[start:end] / np.maximum(visits, 1), parent_q)
+            u = self.c_puct * self.prior[start:end] * math.sqrt(max(self.visits[node], 1)) / (1 + visits)
+            node = start + int(np.argmax(q + u))
+            board.push(decode_move(int(self.move[node])))
+            path.append(node)
+        self.visits[path] += self.virtual_loss
+        self.value_sum[path] -= self.virtual_loss
+        return path, board
+
+    def _backup(self, path, value):
+        """`value` is for the side to move at the leaf; also removes the virtual loss added by _select."""
+        value = -value
+        for node in reversed(path):
+            self.visits[node] += 1 - self.virtual_loss
+            self.value_sum[node] += value + self.virtual_loss
+            value = -value
+        self.simulations_done += 1
+
+    def _cancel(self, path):
+        self.visits[path] -= self.virtual_loss
+        self.value_sum[path] += self.virtual_loss
+
+    def _expand(self, node, board, output):
+        moves = list(board.legal_moves)
+        count = len(moves)
+        if self.size + count > self.capacity:
+            return False
+        start = self.size
+        self.size += count
+        self.first_child[node] = start
+        self.child_count[node] = count
+        self.state[node] = EXPANDED
+        block = slice(start, start + count)
+        self.move[block] = [encode_move(move) for move in moves]
+        self.prior[block] = move_probabilities(output, moves, from_power=1.0, to_power=1.0)
+        self.first_child[block] = -1
+        self.child_count[block] = 0
+        self.state[block] = UNEXPANDED
+        self.visits[block] = 0
+        self.value_sum[block] = 0
+        return True
+
+    def _leaf_values(self, boards):
+        if self.value_fn is not None:
+            return np.asarray(self.value_fn(boards), dtype=np.float32)
+        return np.array([math.tanh(quiescence(board, -math.inf, math.inf, self.evaluate, self.quiescence_depth) / self.value_scale)
+                         for board in boards], dtype=np.float32)
+
+    def _run_batch(self):
+        """Collects up to batch_size leaves, evaluates them in one forward pass, expands and backs up. False when the pool is full."""
+        pending, paths, boards = set(), [], []
+        for _ in range(self.batch_size):
+            path, board = self._select()
+            leaf = path[-1]
+            if self.state[leaf] == UNEXPANDED and board.is_game_over(claim_draw=len(path) > 1):
+                self.state[leaf] = TERMINAL
+                self.terminal_value[leaf] = -1.0 if board.is_checkmate() else 0.0
+            if self.state[leaf] == TERMINAL:
+                self._backup(path, self.terminal_value[leaf])
+                continue
+            if leaf in pending:
+                # Virtual loss did not steer this descent elsewhere; evaluate what we have
+                self._cancel(path)
+                self.collisions += 1
+                break
+            pending.add(leaf)
+            paths.append(path)
+            boards.append(board)
+        if not boards:
+            return True
+
+        start = time.perf_counter()
+        outputs = np.asarray(self.model(network_planes(boards)), dtype=np.float32)
+        self.inference_time += time.perf_counter() - start
+        self.batches += 1
+        self.evaluated += len(boards)
+        values = self._leaf_values(boards)
+        room = True
+        for path, board, output, value in zip(paths, boards, outputs, values):
+            if room and not self._expand(path[-1], board, output):
+                room = False
+            self._backup(path, value)
+        return room
+
+    def choose_move(self, board):
+        start = time.perf_counter()
+        self._advance(board)
+        moves = list(board.legal_moves)
+        if len(moves) == 1:
+            return moves[0]
+        target = self.simulations_done + self.simulations
+        while self.simulations_done < target:
+            if not self._run_batch():
+                self._compact()
+                if self.size > self.capacity // 2:
+                    break  # The tree under the root alone fills the pool
+        self.search_time += time.perf_counter() - start
+        start = self.first_child[self.root]
+        if start < 0:
+            return moves[0]
+        best = start + int(np.argmax(self.visits[start:start + self.child_count[self.root]]))
+        return decode_move(int(self.move[best]))
+
+    def __str__(self):
+        mean_batch = self.evaluated / self.batches if self.batches else 0
+        return (f"MCTS: {self.simulations_done} simulations ({self.reused} reused) in {self.search_time:.2f} s, "
+                f"{self.batches} batches of {mean_batch:.1f} leaves ({1000 * self.inference_time:.0f} ms inference), "
+                f"{self.collisions} collisions, {self.size} nodes in pool")
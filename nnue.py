@@ -0,0 +1,324 @@
+"""
+NNUE-style evaluation in NumPy: a 768-input feature transformer per perspective whose int16 accumulators are
+updated incrementally as moves are made and unmade, followed by small int8/int32 dense layers.
+
+    768 -> 256 (x2 perspectives, int16)  ->  32 -> 32 -> 1 (int8 weights, int32 sums)
+
+A feature is (own/their piece, piece type, square) seen from one side, with the board mirrored vertically
+for Black, so both perspectives share one weight matrix. Making a move adds and subtracts two to four rows
+of that matrix instead of summing all active features again.
+
+The trainer uses the same value-data.npz as valuenet.py (positions replayed from chess_games.csv with game
+outcomes and optional engine evaluations):
+
+    python valuenet.py build chess_games.csv -o value-data.npz --target engine
+    python nnue.py train value-data.npz -o nnue.npz
+    python nnue.py bench nnue.npz
+"""
+import time
+import argparse
+import numpy as np
+import chess
+from board_rep import PIECE_ORDER
+from packed import square_codes, white_to_move
+
+FEATURES = 768
+HIDDEN = 256
+# Fixed-point scales: activations are clipped to [0, QA] (1.0), dense weights are stored times QB
+QA, QB = 127, 64
+# The network output is in units of EVAL_SCALE centipawns, so tanh(output) lines up with the value-data targets
+EVAL_SCALE = 400
+
+# _INDEX[perspective, color, piece_type, square] -> feature; perspective 0 is White, 1 is Black
+_INDEX = np.zeros((2, 2, 7, 64), dtype=np.int64)
+for _perspective, _side in enumerate((chess.WHITE, chess.BLACK)):
+    for _color in (chess.WHITE, chess.BLACK):
+        for _plane, _piece_type in enumerate(PIECE_ORDER):
+            for _square in range(64):
+                _relative = _square if _side == chess.WHITE else _square ^ 56
+                _INDEX[_perspective, int(_color), _piece_type, _square] = ((0 if _color == _side else 6) + _plane) * 64 + _relative
+
+def board_feature_indices(board):
+    """(2, n) feature indices of every piece, White's perspective in row 0 and Black's in row 1."""
+    squares, colors, piece_types = [], [], []
+    for square, piece in board.piece_map().items():
+        squares.append(square)
+        colors.append(int(piece.color))
+        piece_types.append(piece.piece_type)
+    return _INDEX[:, colors, piece_types, squares]
+
+def packed_feature_indices(records):
+    """(N, 34) packed records -> (white, black) perspective feature matrices of shape (N, 768), for training."""
+    codes = square_codes(records)
+    rows, squares = np.nonzero(codes)
+    piece_codes = codes[rows, squares]
+    colors = (piece_codes & 8 == 0).astype(np.int64)  # packed.py marks Black pieces with 8
+    piece_types = piece_codes & 7
+    features = np.zeros((2, len(codes), FEATURES), dtype=np.float32)
+    for perspective in range(2):
+        features[perspective, rows, _INDEX[perspective, colors, piece_types, squares]] = 1
+    return features[0], features[1]
+
+def move_changes(board, move):
+    """Pieces removed and added by `move` (not yet pushed), as (color, piece type, square) lists."""
+    piece = board.piece_at(move.from_square)
+    color = int(piece.color)
+    removed = [(color, piece.piece_type, move.from_square)]
+    added = []
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        if board.is_kingside_castling(move):
+            king_to, rook_from, rook_to = chess.square(6, rank), chess.square(7, rank), chess.square(5, rank)
+        else:
+            king_to, rook_from, rook_to = chess.square(2, rank), chess.square(0, rank), chess.square(3, rank)
+        added.append((color, chess.KING, king_to))
+        removed.append((color, chess.ROOK, rook_from))
+        added.append((color, chess.ROOK, rook_to))
+        return removed, added
+    added.append((color, move.promotion or piece.piece_type, move.to_square))
+    if board.is_en_passant(move):
+        removed.append((1 - color, chess.PAWN, move.to_square ^ 8))
+    else:
+        captured = board.piece_at(move.to_square)
+        if captured is not None:
+            removed.append((int(captured.color), captured.piece_type, move.to_square))
+    return removed, added
+
+class NNUE:
+    """Quantized network from `python nnue.py train`."""
+    def __init__(self, path):
+        weights = np.load(path)
+        self.ft_w = weights['ft_w'].astype(np.int16)
+        self.ft_b = weights['ft_b'].astype(np.int16)
+        # Dense weights are int8 on disk; kept as int32 so the products accumulate without overflow
+        self.l1_w = weights['l1_w'].astype(np.int32)
+        self.l1_b = weights['l1_b'].astype(np.int32)
+        self.l2_w = weights['l2_w'].astype(np.int32)
+        self.l2_b = weights['l2_b'].astype(np.int32)
+        self.out_w = weights['out_w'].astype(np.int32)
+        self.out_b = int(weights['out_b'])
+
+    def refresh(self, board):
+        """Full (2, HIDDEN) accumulator of a position."""
+        return self.ft_b + self.ft_w[board_feature_indices(board)].sum(axis=1, dtype=np.int16)
+
+    def update(self, board, move, accumulator):
+        """Accumulator after `move`, from the accumulator before it; board is still in the position before the move."""
+        if not move:
+            return accumulator  # Null move: only the side to move changes
+        removed, added = move_changes(board, move)
+        for color, piece_type, square in removed:
+            accumulator = accumulator - self.ft_w[_INDEX[:, color, piece_type, square]]
+        for color, piece_type, square in added:
+            accumulator = accumulator + self.ft_w[_INDEX[:, color, piece_type, square]]
+        return accumulator
+
+    def forward(self, accumulator, turn):
+        """Side-to-move score in centipawns."""
+        us, them = (0, 1) if turn == chess.WHITE else (1, 0)
+        x = np.clip(np.concatenate([accumulator[us], accumulator[them]]), 0, QA).astype(np.int32)
+        x = np.clip((x @ self.l1_w + self.l1_b) >> 6, 0, QA)
+        x = np.clip((x @ self.l2_w + self.l2_b) >> 6, 0, QA)
+        return int(x @ self.out_w + self.out_b) * EVAL_SCALE / (QA * QB)
+
+    def evaluate(self, board):
+        """Drop-in for evaluate_board's static part: centipawns from White's point of view."""
+        if isinstance(board, NNUEBoard) and board.nnue is self and board.accumulators:
+            accumulator = board.accumulators[-1]
+        else:
+            accumulator = self.refresh(board)
+        score = self.forward(accumulator, board.turn)
+        return score if board.turn == chess.WHITE else -score
+
+class NNUEBoard(chess.Board):
+    """
+    chess.Board that keeps one NNUE accumulator per position on its move stack, updated on push and dropped on
+    pop, so a search using this board gets incremental evaluation without any change to its make/unmake code.
+    Direct edits (set_piece_at, remove_piece_at, reset, set_fen) clear the move stack, as in python-chess, and
+    refresh the current accumulator.
+    """
+    def __init__(self, fen=chess.STARTING_FEN, *, chess960=False, nnue=None):
+        self.nnue = nnue
+        self.accumulators = []
+        super().__init__(fen, chess960=chess960)
+        self.refresh()
+
+    def refresh(self):
+        if self.nnue is not None:
+            self.accumulators[-1:] = [self.nnue.refresh(self)]
+
+    def push(self, move):
+        if self.nnue is not None:
+            self.accumulators.append(self.nnue.update(self, move, self.accumulators[-1]))
+        super().push(move)
+
+    def pop(self):
+        move = super().pop()
+        if self.nnue is not None:
+            self.accumulators.pop()
+        return move
+
+    def clear_stack(self):
+        super().clear_stack()
+        del self.accumulators[:-1]
+
+    def reset(self):
+        super().reset()
+        self.refresh()
+
+    def set_fen(self, fen):
+        super().set_fen(fen)
+        self.refresh()
+
+    def set_piece_at(self, square, piece, promoted=False):
+        super().set_piece_at(square, piece, promoted)
+        self.refresh()
+
+    def remove_piece_at(self, square):
+        piece = super().remove_piece_at(square)
+        self.refresh()
+        return piece
+
+    def copy(self, *, stack=True):
+        board = super().copy(stack=stack)
+        board.nnue = self.nnue
+        # Accumulators are never modified in place, so the copy can share them
+        board.accumulators = self.accumulators[len(self.accumulators) - len(board.move_stack) - 1:]
+        return board
+
+def train_nnue(data_path, output, epochs=4, batch_size=1024, lr=1e-3, mix=0.5, val_fraction=0.05, seed=0, device='cpu'):
+    """
+    Trains on value-data.npz (see valuenet.py) and writes the quantized weights NNUE loads.
+    Targets are White-relative outcomes / squashed engine evals, turned to the side to move; the loss is the MSE
+    between tanh(output) and the target. mix weighs the outcome against the engine evaluation, which
+    `valuenet.py build --target engine` takes from engine.reference_engine (the shared hand-written evaluation).
+    """
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    class NNUEModel(nn.Module):
+        def __init__(self):
+            super(NNUEModel, self).__init__()
+            self.ft = nn.Linear(FEATURES, HIDDEN)
+            self.l1 = nn.Linear(2 * HIDDEN, 32)
+            self.l2 = nn.Linear(32, 32)
+            self.out = nn.Linear(32, 1)
+
+        def forward(self, white, black, stm):
+            w, b = self.ft(white), self.ft(black)
+            x = torch.where(stm, torch.cat([w, b], dim=1), torch.cat([b, w], dim=1))
+            x = torch.clamp(x, 0, 1)
+            x = torch.clamp(self.l1(x), 0, 1)
+            x = torch.clamp(self.l2(x), 0, 1)
+            return self.out(x).squeeze(-1)
+
+    data = np.load(data_path)
+    positions = data['positions']
+    targets = data['outcomes'].astype(np.float32)
+    if 'evals' in data.files:
+        targets = mix * targets + (1 - mix) * data['evals']
+    targets = np.where(white_to_move(positions), targets, -targets).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(positions))
+    val_count = int(len(order) * val_fraction)
+    val_index, train_index = order[:val_count], order[val_count:]
+
+    torch.manual_seed(seed)
+    model = NNUEModel().to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    dense_limit = 127 / QB  # Dense weights must fit in int8 after scaling by QB
+
+    def batches(index):
+        for start in range(0, len(index), batch_size):
+            part = np.sort(index[start:start + batch_size])
+            white, black = packed_feature_indices(positions[part])
+            stm = torch.from_numpy(white_to_move(positions[part])).to(device).unsqueeze(1)
+            yield (torch.from_numpy(white).to(device), torch.from_numpy(black).to(device), stm,
+                   torch.from_numpy(targets[part]).to(device))
+
+    for epoch in range(epochs):
+        model.train()
+        rng.shuffle(train_index)
+        total, count = 0.0, 0
+        for white, black, stm, y in batches(train_index):
+            optimizer.zero_grad()
+            loss = F.mse_loss(torch.tanh(model(white, black, stm)), y)
+            loss.backward()
+            optimizer.step()
+            with torch.no_grad():
+                for layer in (model.l1, model.l2, model.out):
+                    layer.weight.clamp_(-dense_limit, dense_limit)
+            total += loss.item() * len(y)
+            count += len(y)
+        model.eval()
+        val_total = 0.0
+        with torch.no_grad():
+            for white, black, stm, y in batches(val_index):
+                val_total += F.mse_loss(torch.tanh(model(white, black, stm)), y, reduction='sum').item()
+        print(f"Epoch {epoch + 1}/{epochs}, train MSE {total / max(count, 1):.4f}, val MSE {val_total / max(val_count, 1):.4f}")
+
+    w = {name: tensor.detach().cpu().numpy() for name, tensor in model.state_dict().items()}
+    np.savez(output,
+             ft_w=np.round(w['ft.weight'].T * QA).astype(np.int16), ft_b=np.round(w['ft.bias'] * QA).astype(np.int16),
+             l1_w=np.round(w['l1.weight'].T * QB).astype(np.int8), l1_b=np.round(w['l1.bias'] * QA * QB).astype(np.int32),
+             l2_w=np.round(w['l2.weight'].T * QB).astype(np.int8), l2_b=np.round(w['l2.bias'] * QA * QB).astype(np.int32),
+             out_w=np.round(w['out.weight'][0] * QB).astype(np.int8), out_b=np.int32(round(float(w['out.bias'][0]) * QA * QB)))
+    print(f"Saved {output}")
+    return model
+
+def benchmark(nnue, games=20, seed=0):
+    """Microseconds per move: incremental push + evaluate against a full refresh + evaluate and the PST evaluation."""
+    from engine import reference_engine
+    evaluate_board = reference_engine().evaluate_board
+    rng = np.random.default_rng(seed)
+    lines = []
+    for _ in range(games):
+        board = chess.Board()
+        moves = []
+        while not board.is_game_over() and len(moves) < 80:
+            legal = list(board.legal_moves)
+            moves.append(legal[rng.integers(len(legal))])
+            board.push(moves[-1])
+        lines.append(moves)
+    plies = sum(len(moves) for moves in lines)
+
+    start = time.perf_counter()
+    for moves in lines:
+        board = NNUEBoard(nnue=nnue)
+        for move in moves:
+            board.push(move)
+            nnue.evaluate(board)
+    incremental = time.perf_counter() - start
+
+    timings = {'nnue incremental': incremental}
+    for name, function in (('nnue refresh', lambda b: nnue.forward(nnue.refresh(b), b.turn)), ('pst', evaluate_board)):
+        start = time.perf_counter()
+        for moves in lines:
+            board = chess.Board()
+            for move in moves:
+                board.push(move)
+                function(board)
+        timings[name] = time.perf_counter() - start
+    for name, seconds in timings.items():
+        print(f"{name:>17}: {1e6 * seconds / plies:.1f} us/move")
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and benchmark the NNUE evaluator.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    train = commands.add_parser('train', help="train on value-data.npz from `python valuenet.py build`")
+    train.add_argument('data', nargs='?', default='value-data.npz')
+    train.add_argument('-o', '--output', default='nnue.npz')
+    train.add_argument('--epochs', type=int, default=4)
+    train.add_argument('--batch-size', type=int, default=1024)
+    train.add_argument('--lr', type=float, default=1e-3)
+    train.add_argument('--mix', type=float, default=0.5, help="weight of the game outcome against the engine eval")
+    bench = commands.add_parser('bench', help="compare incremental updates, full refreshes and the PST evaluation")
+    bench.add_argument('weights', nargs='?', default='nnue.npz')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train_nnue(args.data, args.output, args.epochs, args.batch_size, args.lr, args.mix)
+    else:
+        benchmark(NNUE(args.weights))
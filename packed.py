@@ -0,0 +1,85 @@
+"""
+Compact 34-byte position records for training shards and position databases.
+
+    bytes 0-31  nibble board, square a1 = low nibble of byte 0 ... h8 = high nibble of byte 31;
+                0 is empty, 1-6 a white pawn/knight/bishop/rook/queen/king (python-chess piece types),
+                9-14 the same black pieces (8 | piece type)
+    byte 32     bit 0 set when White is to move, bits 1-4 castling rights K, Q, k, q
+    byte 33     en passant square, or 255 for none
+
+That is 34 bytes against 1536 for the float32 6x8x8 planes, and packed_2_rep decodes whole arrays of
+records to planes at once.
+"""
+import numpy as np
+import chess
+from board_rep import PIECE_ORDER, board_bitboards
+
+RECORD_SIZE = 34
+NO_EP = 255
+CASTLING_SQUARES = [chess.H1, chess.A1, chess.H8, chess.A8]
+
+# Nibble code of every (color, plane) bitboard returned by board_bitboards
+_BITBOARD_CODES = np.array([piece_type for piece_type in PIECE_ORDER] + [8 | piece_type for piece_type in PIECE_ORDER], dtype=np.uint8)
+
+# Nibble code -> CNN plane (p, r, n, b, q, k order) and sign
+_PLANE = np.zeros(16, dtype=np.int64)
+_SIGN = np.zeros(16, dtype=np.int8)
+for _plane, _piece_type in enumerate(PIECE_ORDER):
+    _PLANE[_piece_type] = _PLANE[8 | _piece_type] = _plane
+    _SIGN[_piece_type] = 1
+    _SIGN[8 | _piece_type] = -1
+
+def encode_many(boards):
+    """N boards -> (N, 34) uint8 records."""
+    records = np.zeros((len(boards), RECORD_SIZE), dtype=np.uint8)
+    if not len(boards):
+        return records
+    bitboards = np.stack([board_bitboards(board) for board in boards]).astype('<u8')
+    bits = np.unpackbits(bitboards.view(np.uint8), axis=-1, bitorder='little').reshape(len(boards), 12, 64)
+    codes = (bits * _BITBOARD_CODES[None, :, None]).sum(axis=1, dtype=np.uint8)
+    records[:, :32] = codes[:, 0::2] | (codes[:, 1::2] << 4)
+    for i, board in enumerate(boards):
+        flags = int(board.turn == chess.WHITE)
+        for bit, square in enumerate(CASTLING_SQUARES):
+            if board.castling_rights & chess.BB_SQUARES[square]:
+                flags |= 2 << bit
+        records[i, 32] = flags
+        records[i, 33] = NO_EP if board.ep_square is None else board.ep_square
+    return records
+
+def encode(board):
+    return encode_many([board])[0]
+
+def decode(record):
+    """One record -> chess.Board (move counters are not stored)."""
+    board = chess.Board(None)
+    for square in range(64):
+        code = (record[square >> 1] >> (4 * (square & 1))) & 15
+        if code:
+            board.set_piece_at(square, chess.Piece(code & 7, not code & 8))
+    flags = int(record[32])
+    board.turn = bool(flags & 1)
+    board.castling_rights = 0
+    for bit, square in enumerate(CASTLING_SQUARES):
+        if flags & (2 << bit):
+            board.castling_rights |= chess.BB_SQUARES[square]
+    board.ep_square = None if record[33] == NO_EP else int(record[33])
+    return board
+
+def square_codes(records):
+    """(N, 34) records -> (N, 64) nibble codes indexed by square."""
+    records = np.asarray(records, dtype=np.uint8)
+    codes = np.empty(records.shape[:-1] + (64,), dtype=np.uint8)
+    codes[..., 0::2] = records[..., :32] & 15
+    codes[..., 1::2] = records[..., :32] >> 4
+    return codes
+
+def white_to_move(records):
+    return (np.asarray(records)[..., 32] & 1).astype(np.bool_)
+
+def packed_2_rep(records):
+    """(..., 34) records -> (..., 6, 8, 8) float32 planes, identical to board_rep.board_2_rep."""
+    codes = square_codes(records)
+    planes = (_PLANE[codes][..., None, :] == np.arange(6)[:, None]) * _SIGN[codes][..., None, :]
+    planes = planes.reshape(codes.shape[:-1] + (6, 8, 8))
+    return planes[..., ::-1, :].astype(np.float32)
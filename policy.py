@@ -0,0 +1,65 @@
+"""
+Legal-move probabilities from ChessNet's (2, 8, 8) from/to output, in one vectorized pass.
+
+Each legal move is a (from, to) pair of flattened plane indices (square ^ 56, plane row 0 is rank 8). Moves are
+scored by a masked softmax over the legal from-squares, times the probability of their to-square among the
+moves sharing that from-square.
+"""
+import numpy as np
+import chess
+from board_rep import boards_2_rep
+
+def network_planes(boards):
+    """Boards -> (N, 6, 8, 8) network input; as in choose_move, the planes are negated when Black is to move."""
+    x = boards_2_rep(boards)
+    x[np.array([board.turn == chess.BLACK for board in boards], dtype=np.bool_)] *= -1
+    return x
+
+def move_indices(moves):
+    """Legal moves -> (from, to) index arrays into the flattened 8x8 output planes."""
+    from_index = np.fromiter((move.from_square for move in moves), dtype=np.intp, count=len(moves)) ^ 56
+    to_index = np.fromiter((move.to_square for move in moves), dtype=np.intp, count=len(moves)) ^ 56
+    return from_index, to_index
+
+def masked_softmax(logits, mask):
+    logits = np.where(mask, logits, -np.inf)
+    exp = np.exp(logits - logits.max())
+    return exp / exp.sum()
+
+def grouped_softmax(values, groups, size=64):
+    """Softmax of `values` within each group (groups are indices < size)."""
+    group_max = np.full(size, -np.inf)
+    np.maximum.at(group_max, groups, values)
+    exp = np.exp(values - group_max[groups])
+    sums = np.zeros(size)
+    np.add.at(sums, groups, exp)
+    return exp / sums[groups]
+
+def move_probabilities(output, moves, from_power=3.0, to_power=None, indices=None):
+    """
+    Probability of every move in `moves` (sums to 1) from one network output of shape (2, 8, 8) or (1, 2, 8, 8).
+
+    from_power sharpens the from-square distribution; 3 matches choose_move's original exp(v) ** 3.
+    to_power=None puts all of a from-square's mass on its best to-square (choose_move's argmax);
+    a number instead splits it with a softmax of to_power * logit.
+    """
+    if not len(moves):
+        return np.zeros(0)
+    planes = np.asarray(output, dtype=np.float64).reshape(2, 64)
+    from_index, to_index = move_indices(moves) if indices is None else indices
+    mask = np.zeros(64, dtype=np.bool_)
+    mask[from_index] = True
+    from_probs = masked_softmax(from_power * planes[0], mask)
+
+    to_logits = planes[1, to_index]
+    if to_power is None:
+        group_max = np.full(64, -np.inf)
+        np.maximum.at(group_max, from_index, to_logits)
+        best = np.flatnonzero(to_logits == group_max[from_index])
+        # Ties (e.g. the four promotions of one pawn move) go to the first move, the queen promotion
+        _, first = np.unique(from_index[best], return_index=True)
+        to_probs = np.zeros(len(moves))
+        to_probs[best[first]] = 1
+    else:
+        to_probs = grouped_softmax(to_power * to_logits, from_index)
+    return from_probs[from_index] * to_probs
@@ -0,0 +1,119 @@
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+import chess
+import chess.polyglot
+from policy import network_planes, move_probabilities
+
+class PolicyOrderer:
+    """
+    Orders alpha-beta moves by ChessNet's from/to output for the first `plies` plies of the search.
+    When a node inside that window is expanded, all of its children that will be ordered too are run through
+    the network in one batch; outputs are kept in an LRU keyed by Zobrist hash, so transpositions and
+    re-searches on later moves are free.
+
+    With top_k and/or mass set, the first prune_plies plies are also pruned: only the most probable moves are
+    searched (at most top_k of them, and no more than needed to cover `mass` of the probability), plus every
+    capture, check and promotion.
+    """
+    def __init__(self, model_path, plies=2, lru_size=50000, threads=None, top_k=None, mass=None, prune_plies=2):
+        self.model_path = model_path
+        self.plies = plies
+        self.top_k = top_k
+        self.mass = mass
+        self.prune_plies = prune_plies
+        self.lru = OrderedDict()
+        self.lru_size = lru_size
+        self.model = None
+        if model_path and os.path.exists(model_path):
+            # Imported here so the engines only need torch when a model is actually used
+            from cnn_export import CpuPolicy
+            self.model = CpuPolicy(model_path, threads)
+            print(f"Loaded {model_path!r}, ordering moves with the CNN policy for {plies} plies.")
+        else:
+            print(f"No exported CNN at {model_path!r}, policy move ordering disabled.")
+        self.reset_stats()
+
+    def active(self, ply):
+        return self.model is not None and ply < self.plies
+
+    def _store(self, key, output):
+        self.lru[key] = output
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def _evaluate(self, boards, keys):
+        """One forward pass over `boards`; the outputs are cached under `keys`."""
+        x = network_planes(boards)
+        start = time.perf_counter()
+        outputs = np.asarray(self.model(x), dtype=np.float32).reshape(len(boards), 2, 64)
+        self.inference_time += time.perf_counter() - start
+        self.batches += 1
+        self.positions += len(boards)
+        for key, output in zip(keys, outputs):
+            self._store(key, output)
+        return outputs
+
+    def _output(self, board, key):
+        output = self.lru.get(key)
+        if output is not None:
+            self.lru.move_to_end(key)
+            self.cache_hits += 1
+            return output
+        return self._evaluate([board], [key])[0]
+
+    def _prefetch(self, board, moves):
+        children, keys = [], []
+        for move in moves:
+            board.push(move)
+            key = chess.polyglot.zobrist_hash(board)
+            if key not in self.lru and not board.is_game_over():
+                children.append(board.copy(stack=False))
+                keys.append(key)
+            board.pop()
+        if children:
+            self._evaluate(children, keys)
+
+    def pruning(self, ply):
+        return (self.top_k is not None or self.mass is not None) and ply < self.prune_plies
+
+    def _keep_count(self, sorted_probs):
+        keep = len(sorted_probs)
+        if self.mass is not None:
+            keep = min(keep, int(np.searchsorted(np.cumsum(sorted_probs), self.mass)) + 1)
+        if self.top_k is not None:
+            keep = min(keep, self.top_k)
+        return keep
+
+    def order(self, board, ply):
+        """Legal moves, most probable first according to the network; pruned near the root when configured."""
+        moves = list(board.legal_moves)
+        if len(moves) < 2:
+            return moves
+        output = self._output(board, chess.polyglot.zobrist_hash(board))
+        probs = move_probabilities(output, moves, from_power=1.0, to_power=1.0)
+        ranking = np.argsort(-probs, kind='stable')
+        moves = [moves[i] for i in ranking]
+        if self.pruning(ply):
+            keep = self._keep_count(probs[ranking])
+            searched = moves[:keep] + [move for move in moves[keep:]
+                                       if move.promotion or board.is_capture(move) or board.gives_check(move)]
+            self.pruned += len(moves) - len(searched)
+            moves = searched
+        if ply + 1 < self.plies:
+            self._prefetch(board, moves)
+        return moves
+
+    def reset_stats(self):
+        self.batches = 0
+        self.positions = 0
+        self.cache_hits = 0
+        self.pruned = 0
+        self.inference_time = 0.0
+
+    def __str__(self):
+        if self.model is None:
+            return "policy ordering off"
+        return (f"policy {self.positions} positions in {self.batches} batches "
+                f"({1000 * self.inference_time:.1f} ms), {self.cache_hits} cached, {self.pruned} moves pruned")
@@ -0,0 +1,38 @@
+"""
+Writer for the .npy training shards read by shards.ShardDataset.
+
+Kept apart from shards.py, which needs torch for the Dataset, so that tools producing shards (dedup.py)
+only depend on NumPy.
+"""
+import os
+import numpy as np
+
+class ShardWriter:
+    """Buffers samples and saves a shard every shard_size samples, one <kind>_<shard>.npy file per column."""
+    def __init__(self, out_dir, shard_size, kinds=('pos', 'from', 'to')):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.kinds = kinds
+        self.shard = 0
+        self.total = 0
+        self.parts = []
+        self.buffered = 0
+
+    def write(self, parts):
+        self.parts.append(parts)
+        self.buffered += len(parts[0])
+        self.total += len(parts[0])
+        while self.buffered >= self.shard_size:
+            self._flush(self.shard_size)
+
+    def _flush(self, count):
+        columns = [np.concatenate(column) for column in zip(*self.parts)]
+        for kind, column in zip(self.kinds, columns):
+            np.save(os.path.join(self.out_dir, f'{kind}_{self.shard:05d}.npy'), column[:count])
+        self.parts = [tuple(column[count:] for column in columns)]
+        self.buffered -= count
+        self.shard += 1
+
+    def close(self):
+        if self.buffered:
+            self._flush(self.buffered)
@@ -0,0 +1,109 @@
+"""
+Precomputed CNN training samples.
+
+Every game is replayed once and each of its positions becomes a sample: the position as a 34-byte
+packed record (see packed.py) and the from/to squares of the move played. Samples are written to
+memory-mapped .npy shards, so ShardDataset only indexes arrays and never parses SAN; records are decoded
+to 6x8x8 planes (negated when Black is to move, as ChessDataset does) when a sample is fetched.
+"""
+import os
+import re
+import glob
+import bisect
+import multiprocessing
+import numpy as np
+import chess
+import torch
+from torch.utils.data import Dataset
+from packed import encode_many, packed_2_rep, white_to_move
+from shard_writer import ShardWriter
+
+def create_move_list(s):
+    return re.sub(r'\d*\. ', '', s).split(' ')[:-1]
+
+def game_samples(game):
+    """Replays one AN string; returns (packed positions (n, 34), from (n,), to (n,)) in flattened plane coordinates."""
+    moves = create_move_list(game)
+    board = chess.Board()
+    boards, froms, tos = [], [], []
+    try:
+        # Like ChessDataset, the last move of the game is never a target
+        for san in moves[:-1]:
+            move = board.parse_san(san)
+            boards.append(board.copy(stack=False))
+            # Plane row 0 is rank 8, so the flattened plane index of a square is square ^ 56
+            froms.append(move.from_square ^ 56)
+            tos.append(move.to_square ^ 56)
+            board.push(move)
+    except ValueError:
+        pass  # Keep the positions before an unparsable move
+    return encode_many(boards), np.array(froms, dtype=np.uint8), np.array(tos, dtype=np.uint8)
+
+def _batch_samples(games):
+    samples = [game_samples(game) for game in games]
+    return tuple(np.concatenate(part) for part in zip(*samples))
+
+def build_shards(games, out_dir, shard_size=1_000_000, processes=None, games_per_task=256):
+    """Replays every AN string in `games` once and writes the samples to shards in out_dir."""
+    os.makedirs(out_dir, exist_ok=True)
+    writer = ShardWriter(out_dir, shard_size)
+    batches = [games[i:i + games_per_task] for i in range(0, len(games), games_per_task)]
+    with multiprocessing.Pool(processes) as pool:
+        for i, parts in enumerate(pool.imap(_batch_samples, batches)):
+            writer.write(parts)
+            if i % 100 == 0:
+                print(f'{min((i + 1) * games_per_task, len(games))}/{len(games)} games, {writer.total} samples')
+    writer.close()
+    print(f'Wrote {writer.total} samples from {len(games)} games to {writer.shard} shards in {out_dir}')
+    return writer.total
+
+def sample_planes(records):
+    """(..., 34) records -> network input planes, negated when Black is to move."""
+    planes = packed_2_rep(records)
+    planes[~white_to_move(records)] *= -1
+    return planes
+
+def sample_tensors(record, from_index, to_index, planes=None):
+    """One stored sample -> the (x, y) tensors ChessDataset returns: float planes and one-hot from/to planes."""
+    if planes is None:
+        planes = sample_planes(record)
+    x = torch.from_numpy(planes)
+    y = torch.zeros(2, 64)
+    y[0, from_index] = 1
+    y[1, to_index] = 1
+    return x, y.reshape(2, 8, 8)
+
+class ShardDataset(Dataset):
+    """
+    Samples from build_shards(); returns the same (x, y) tensors as ChessDataset.
+    Shards written by dedup.dedup_shards also carry per-sample weights, exposed as `weights` (None otherwise).
+    """
+    def __init__(self, shard_dir):
+        super(ShardDataset, self).__init__()
+        self.positions, self.froms, self.tos = [], [], []
+        for path in sorted(glob.glob(os.path.join(shard_dir, 'pos_*.npy'))):
+            suffix = os.path.basename(path)[len('pos_'):]
+            self.positions.append(np.load(path, mmap_mode='r'))
+            self.froms.append(np.load(os.path.join(shard_dir, 'from_' + suffix), mmap_mode='r'))
+            self.tos.append(np.load(os.path.join(shard_dir, 'to_' + suffix), mmap_mode='r'))
+        self.offsets = np.cumsum([0] + [len(p) for p in self.positions]).tolist()
+        weight_paths = sorted(glob.glob(os.path.join(shard_dir, 'weight_*.npy')))
+        self.weights = np.concatenate([np.load(path) for path in weight_paths]) if weight_paths else None
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def _locate(self, index):
+        shard = bisect.bisect_right(self.offsets, index) - 1
+        return shard, index - self.offsets[shard]
+
+    def __getitem__(self, index):
+        shard, i = self._locate(index)
+        return sample_tensors(self.positions[shard][i], self.froms[shard][i], self.tos[shard][i])
+
+    def __getitems__(self, indices):
+        # Batched fetch used by the DataLoader: all records of the batch are decoded in one call
+        locations = [self._locate(index) for index in indices]
+        records = np.stack([self.positions[shard][i] for shard, i in locations])
+        planes = sample_planes(records)
+        return [sample_tensors(None, self.froms[shard][i], self.tos[shard][i], planes[k]) for k, (shard, i) in enumerate(locations)]
@@ -0,0 +1,97 @@
+"""
+Streams CNN training samples straight from chess_games.csv, for corpora too large to shard ahead of time.
+
+Each DataLoader worker reads its own byte range of the CSV, replays every game in it once and yields all of
+the game's positions through a bounded shuffle buffer, so batches mix positions from many games. The buffer
+holds packed 34-byte records (packed.py), so even a large one stays small.
+"""
+import io
+import os
+import csv
+import zlib
+import random
+from torch.utils.data import IterableDataset, get_worker_info
+from shards import game_samples, sample_tensors
+
+class GameStream(IterableDataset):
+    """
+    Samples from every game in csv_path, using the notebook's filters (WhiteElo > min_elo, no comments, AN longer than 20).
+    split='train' / 'val' keeps games whose AN hashes into the training / validation share.
+    Call set_epoch() before each epoch to get a different shuffle order.
+    """
+    def __init__(self, csv_path, min_elo=1600, shuffle_buffer=10000, seed=0, split=None, val_fraction=0.2,
+                 num_shards=1, shard_index=0):
+        super(GameStream, self).__init__()
+        self.csv_path = csv_path
+        self.min_elo = min_elo
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.split = split
+        self.val_fraction = val_fraction
+        # num_shards / shard_index split the file further between processes (e.g. one shard per DDP rank)
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _byte_range(self, data_start, size):
+        worker = get_worker_info()
+        workers = worker.num_workers if worker else 1
+        worker_id = worker.id if worker else 0
+        parts = self.num_shards * workers
+        part = self.shard_index * workers + worker_id
+        span = size - data_start
+        return data_start + span * part // parts, data_start + span * (part + 1) // parts, part
+
+    def _games(self, start, end, columns):
+        with open(self.csv_path, 'rb') as f:
+            f.seek(start)
+            if start > 0:
+                f.seek(start - 1)
+                f.readline()  # Finish the line that straddles the boundary; the previous range owns it
+            position = f.tell()
+            while position < end:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                row = next(csv.reader(io.StringIO(line.decode('utf-8', errors='replace'))), None)
+                if not row or len(row) <= max(columns.values()):
+                    continue
+                game = row[columns['AN']]
+                try:
+                    elo = float(row[columns['WhiteElo']])
+                except ValueError:
+                    continue
+                if elo <= self.min_elo or '{' in game or len(game) <= 20:
+                    continue
+                if self.split is not None:
+                    is_val = zlib.crc32(game.encode()) % 1000 < self.val_fraction * 1000
+                    if is_val != (self.split == 'val'):
+                        continue
+                yield game
+
+    def __iter__(self):
+        with open(self.csv_path, 'rb') as f:
+            header = next(csv.reader([f.readline().decode('utf-8')]))
+            data_start = f.tell()
+        columns = {name: header.index(name) for name in ('AN', 'WhiteElo')}
+        size = os.path.getsize(self.csv_path)
+        start, end, part = self._byte_range(data_start, size)
+        rng = random.Random(hash((self.seed, self.epoch, part)))
+
+        buffer = []
+        for game in self._games(start, end, columns):
+            planes, froms, tos = game_samples(game)
+            for sample in zip(planes, froms, tos):
+                if len(buffer) < self.shuffle_buffer:
+                    buffer.append(sample)
+                    continue
+                i = rng.randrange(len(buffer))
+                buffer[i], sample = sample, buffer[i]
+                yield sample_tensors(*sample)
+        rng.shuffle(buffer)
+        for sample in buffer:
+            yield sample_tensors(*sample)
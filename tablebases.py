@@ -0,0 +1,99 @@
+import os
+from collections import OrderedDict
+import chess
+import chess.syzygy
+import chess.polyglot
+
+class TablebaseProber:
+    """
+    Syzygy tablebases opened once at startup.
+    Probes are gated by piece count and castling rights, and WDL results are kept in an LRU keyed by Zobrist hash.
+    """
+    def __init__(self, directory, lru_size=100000):
+        self.directory = directory
+        self.tablebase = None
+        self.max_pieces = 0
+        self.lru = OrderedDict()
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+        self.cache_hits = 0
+        if directory and os.path.isdir(directory):
+            self.tablebase = chess.syzygy.Tablebase()
+            if self.tablebase.add_directory(directory):
+                # Table names look like KQvKR, so the piece count is the name length minus the 'v'
+                self.max_pieces = max(len(name) - 1 for name in self.tablebase.wdl)
+            else:
+                self.tablebase.close()
+                self.tablebase = None
+        if self.tablebase is None:
+            print(f"No Syzygy tables found in {directory!r}, tablebase probing disabled.")
+        else:
+            print(f"Loaded Syzygy tables from {directory!r} (up to {self.max_pieces} pieces).")
+
+    def can_probe(self, board):
+        return (self.tablebase is not None
+                and chess.popcount(board.occupied) <= self.max_pieces
+                and not board.castling_rights)
+
+    def probe_wdl(self, board):
+        """Returns the WDL value for the side to move, or None if the position is not covered."""
+        if not self.can_probe(board):
+            return None
+        key = chess.polyglot.zobrist_hash(board)
+        if key in self.lru:
+            self.lru.move_to_end(key)
+            self.cache_hits += 1
+            return self.lru[key]
+        wdl = self.tablebase.get_wdl(board)
+        if wdl is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.lru[key] = wdl
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+        return wdl
+
+    def probe_root(self, board):
+        """
+        Picks the root move straight from the tables, or returns None if the root is not covered.
+        Moves are ranked by WDL after the move, then by DTZ: fastest progress when winning, longest resistance when losing.
+        """
+        if not self.can_probe(board):
+            return None
+        best_move = None
+        best_rank = None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    rank = (3, 0)
+                else:
+                    wdl = self.tablebase.get_wdl(board)
+                    if wdl is None:
+                        return None
+                    dtz = self.tablebase.get_dtz(board)
+                    # Both values are for the opponent now; a losing opponent has dtz < 0, so closer to 0 is better for us
+                    rank = (-wdl, dtz if dtz is not None else 0)
+            finally:
+                board.pop()
+            if best_rank is None or rank > best_rank:
+                best_rank = rank
+                best_move = move
+        if best_move is not None:
+            self.hits += 1
+        return best_move
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.cache_hits = 0
+
+    def close(self):
+        if self.tablebase is not None:
+            self.tablebase.close()
+            self.tablebase = None
+
+    def __str__(self):
+        return f"tablebase {self.hits} hits, {self.misses} misses, {self.cache_hits} cached"
@@ -0,0 +1,71 @@
+import re
+import random
+import numpy as np
+import chess
+from board_rep import board_2_rep, boards_2_rep
+
+# The notebook's original string-based encoder, kept as the reference for the bitboard one
+def board_2_rep_str(board):
+    pieces = ['p', 'r', 'n', 'b', 'q', 'k']
+    layers = []
+    for piece in pieces:
+        layers.append(create_rep_layer(board, piece))
+    board_rep = np.stack(layers).astype(np.float32)  # Ensure float32 type
+    return board_rep
+
+def create_rep_layer(board, type):
+    s = str(board)
+    s = re.sub(f'[^{type}{type.upper()} \n]', '.', s)
+    s = re.sub(f'{type}', '-1', s)
+    s = re.sub(f'{type.upper()}', '1', s)
+    s = re.sub(r'\.', '0', s)
+
+    board_mat = []
+    for row in s.split('\n'):
+        row = row.split(' ')
+        row = [int(x) for x in row]
+        board_mat.append(row)
+
+    return np.array(board_mat).astype(np.float32)
+
+# Castling rights and en passant squares are not encoded, but must not disturb the piece planes
+SPECIAL_FENS = [
+    chess.STARTING_FEN,
+    'r3k2r/pppppppp/8/8/8/8/PPPPPPPP/R3K2R w KQkq - 0 1',
+    'r3k2r/8/8/8/8/8/8/R3K2R b Kq - 3 20',
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+    'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 2',
+    '4k3/1P6/8/8/8/8/6p1/4K3 w - - 0 60',
+]
+
+def random_boards(count, seed=0):
+    rng = random.Random(seed)
+    boards = []
+    board = chess.Board()
+    while len(boards) < count:
+        if board.is_game_over():
+            board = chess.Board()
+        board.push(rng.choice(list(board.legal_moves)))
+        boards.append(board.copy(stack=False))
+    return boards
+
+def test_special_positions():
+    boards = [chess.Board(fen) for fen in SPECIAL_FENS]
+    assert any(board.ep_square is not None for board in boards)
+    assert any(board.castling_rights for board in boards)
+    for board in boards:
+        rep = board_2_rep(board)
+        assert rep.dtype == np.float32
+        assert np.array_equal(rep, board_2_rep_str(board)), board.fen()
+    assert np.array_equal(boards_2_rep(boards), np.stack([board_2_rep_str(board) for board in boards]))
+
+def test_random_positions():
+    boards = random_boards(1000)
+    assert any(board.ep_square is not None for board in boards)
+    assert any(board.castling_rights for board in boards)
+    for board in boards:
+        assert np.array_equal(board_2_rep(board), board_2_rep_str(board)), board.fen()
+    assert np.array_equal(boards_2_rep(boards), np.stack([board_2_rep_str(board) for board in boards]))
+
+def test_no_boards():
+    assert boards_2_rep([]).shape == (0, 6, 8, 8)
@@ -0,0 +1,34 @@
+import os
+import numpy as np
+import chess
+import chess.polyglot
+from book import ENTRY_DTYPE, OpeningBook, compile_books, encode_move, write_book
+
+def test_compile_books_without_books_writes_empty_book(tmp_path):
+    output = str(tmp_path / 'compiled.bin')
+    assert compile_books([str(tmp_path / 'missing.bin')], output) == 0
+    assert os.path.getsize(output) == 0
+    book = OpeningBook([output])
+    assert len(book) == 0
+    assert book.find_move(chess.Board()) is None
+
+def test_compile_books_with_only_deleted_entries(tmp_path):
+    source = str(tmp_path / 'deleted.bin')
+    board = chess.Board()
+    write_book(source, [chess.polyglot.zobrist_hash(board)], [encode_move(board, chess.Move.from_uci('e2e4'))], [0])
+    output = str(tmp_path / 'compiled.bin')
+    assert compile_books([source], output) == 0
+    assert len(np.fromfile(output, dtype=ENTRY_DTYPE)) == 0
+
+def test_compile_books_sums_weights(tmp_path):
+    board = chess.Board()
+    key = chess.polyglot.zobrist_hash(board)
+    e4, d4 = (encode_move(board, chess.Move.from_uci(uci)) for uci in ('e2e4', 'd2d4'))
+    first, second = str(tmp_path / 'first.bin'), str(tmp_path / 'second.bin')
+    write_book(first, [key, key], [e4, d4], [3, 5])
+    write_book(second, [key], [e4], [4])
+    output = str(tmp_path / 'compiled.bin')
+    assert compile_books([first, second], output) == 2
+    entries = np.fromfile(output, dtype=ENTRY_DTYPE)
+    assert [(int(entry['move']), int(entry['weight'])) for entry in entries] == [(e4, 7), (d4, 5)]
+    assert OpeningBook([output]).find_move(board) == chess.Move.from_uci('e2e4')
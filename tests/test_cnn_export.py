@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from chessnet import ChessNet
+from cnn_export import CpuPolicy, agreement, export_torchscript, network_input, random_positions
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return ChessNet(hidden_layers=1, hidden_size=16).eval()
+
+def _outputs(model, x):
+    with torch.inference_mode():
+        return model(x).numpy()
+
+def test_fp32_export_matches_eager(model, tmp_path):
+    path = str(tmp_path / 'fp32.pt')
+    x = network_input(random_positions(8, seed=1))
+    export_torchscript(model, path, calibration=network_input(random_positions(16)))
+    exported = CpuPolicy(path)(x)
+    assert exported.shape == (8, 2, 8, 8)
+    np.testing.assert_allclose(exported, _outputs(model, x), rtol=1e-4, atol=1e-4)
+
+def test_int8_export_leaves_reference_untouched(model, tmp_path):
+    if not {'x86', 'fbgemm'} & set(torch.backends.quantized.supported_engines):
+        pytest.skip("no x86 quantization engine")
+    path = str(tmp_path / 'int8.pt')
+    positions = random_positions(8, seed=1)
+    x = network_input(positions)
+    before = _outputs(model, x)
+    state = {name: tensor.clone() for name, tensor in model.state_dict().items()}
+    export_torchscript(model, path, quantize=True, calibration=network_input(random_positions(32)))
+
+    # The eager model is still the fp32 reference: same weights, layout and outputs
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(tensor, state[name]), name
+    assert model.input_layer.weight.is_contiguous()
+    np.testing.assert_array_equal(_outputs(model, x), before)
+
+    policy = CpuPolicy(path)
+    quantized = policy(x)
+    assert quantized.shape == before.shape
+    assert np.isfinite(quantized).all()
+    share, difference = agreement(model, policy, positions)
+    assert 0.0 <= share <= 1.0
+    assert difference == pytest.approx(float(np.abs(quantized - before).max()), abs=1e-5)
@@ -0,0 +1,196 @@
+"""
+Per-batch timing of the cnn.ipynb training loop: data-loading wait, host-to-device copy, forward, backward and
+optimizer step, plus samples/sec and DataLoader worker utilization. Windows of log_every batches are written
+to <log_dir>/profile.csv and, when tensorboard is installed, to TensorBoard event files in the same directory.
+
+The split answers whether the input pipeline (SAN replay / shard decoding in the workers) or the convolution
+stack limits throughput: a large 'data' share with busy workers means the loader is the bottleneck, a large
+forward + backward share means the model is.
+"""
+import os
+import csv
+import time
+import multiprocessing
+from contextlib import contextmanager
+import torch
+from torch.utils.data import DataLoader, Dataset, IterableDataset
+
+PHASES = ['data', 'h2d', 'forward', 'backward', 'step']
+
+class TimedDataset(Dataset):
+    """Adds the seconds spent producing samples to a counter shared by all DataLoader workers."""
+    def __init__(self, dataset, busy):
+        super(TimedDataset, self).__init__()
+        self.dataset = dataset
+        self.busy = busy
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def _timed(self, fetch, arg):
+        start = time.perf_counter()
+        result = fetch(arg)
+        with self.busy.get_lock():
+            self.busy.value += time.perf_counter() - start
+        return result
+
+    def __getitem__(self, index):
+        return self._timed(self.dataset.__getitem__, index)
+
+    def __getitems__(self, indices):
+        if hasattr(self.dataset, '__getitems__'):
+            return self._timed(self.dataset.__getitems__, indices)
+        return [self.__getitem__(index) for index in indices]
+
+class TimedIterableDataset(IterableDataset):
+    """TimedDataset for iterable datasets such as GameStream."""
+    def __init__(self, dataset, busy):
+        super(TimedIterableDataset, self).__init__()
+        self.dataset = dataset
+        self.busy = busy
+
+    def set_epoch(self, epoch):
+        self.dataset.set_epoch(epoch)
+
+    def __iter__(self):
+        iterator = iter(self.dataset)
+        while True:
+            start = time.perf_counter()
+            try:
+                sample = next(iterator)
+            except StopIteration:
+                return
+            with self.busy.get_lock():
+                self.busy.value += time.perf_counter() - start
+            yield sample
+
+class TrainProfiler:
+    def __init__(self, log_dir='runs/profile', device=None, log_every=100, sync=True, tensorboard=True):
+        self.device = torch.device(device) if device is not None else None
+        # CUDA kernels run asynchronously; synchronizing at phase boundaries attributes their time correctly
+        self.sync = sync and self.device is not None and self.device.type == 'cuda'
+        self.log_every = log_every
+        self.busy = multiprocessing.Value('d', 0.0)
+        self.num_workers = 0
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, 'profile.csv')
+        new_file = not os.path.exists(path)
+        self.csv_file = open(path, 'a', newline='')
+        self.csv = csv.writer(self.csv_file)
+        if new_file:
+            self.csv.writerow(['step', 'epoch', 'samples_per_sec'] + [f'{phase}_ms' for phase in PHASES] + ['worker_utilization'])
+        self.writer = None
+        if tensorboard:
+            try:
+                from torch.utils.tensorboard import SummaryWriter
+                self.writer = SummaryWriter(log_dir)
+            except ImportError:
+                pass  # CSV only
+        self.step = 0
+        self.epoch = 0
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.samples = 0
+        self.total_time = 0.0
+        self.total_busy = 0.0
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window = dict.fromkeys(PHASES, 0.0)
+        self.window_batches = 0
+        self.window_samples = 0
+        self.window_start = time.perf_counter()
+        self.window_busy = self.busy.value
+
+    def wrap_loader(self, loader):
+        """Rebuilds `loader` around a timed copy of its dataset, so worker busy time can be measured."""
+        dataset = loader.dataset
+        self.num_workers = loader.num_workers
+        kwargs = dict(batch_size=loader.batch_size, num_workers=loader.num_workers, collate_fn=loader.collate_fn,
+                      pin_memory=loader.pin_memory, drop_last=loader.drop_last)
+        if loader.num_workers > 0:
+            kwargs.update(persistent_workers=loader.persistent_workers, prefetch_factor=loader.prefetch_factor)
+        if isinstance(dataset, IterableDataset):
+            return DataLoader(TimedIterableDataset(dataset, self.busy), **kwargs)
+        return DataLoader(TimedDataset(dataset, self.busy), sampler=loader.sampler, **kwargs)
+
+    def _synchronize(self):
+        if self.sync:
+            torch.cuda.synchronize(self.device)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._synchronize()
+            self.window[name] += time.perf_counter() - start
+
+    def iterate(self, loader, epoch=None):
+        """Iterates `loader`, timing how long the training loop waits for each batch."""
+        if epoch is not None:
+            self.epoch = epoch
+        # Time between epochs (validation, checkpoints) is not training throughput
+        self.flush()
+        self._reset_window()
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.window['data'] += time.perf_counter() - start
+            yield batch
+
+    def end_batch(self, batch_size):
+        self.step += 1
+        self.window_batches += 1
+        self.window_samples += batch_size
+        if self.window_batches >= self.log_every:
+            self.flush()
+
+    def worker_utilization(self, elapsed, busy):
+        # Without workers the main process loads the data itself, inside the 'data' phase
+        return busy / (max(self.num_workers, 1) * elapsed) if elapsed > 0 else 0.0
+
+    def flush(self):
+        if not self.window_batches:
+            return
+        elapsed = time.perf_counter() - self.window_start
+        busy = self.busy.value - self.window_busy
+        rate = self.window_samples / elapsed
+        phase_ms = {phase: 1000 * seconds / self.window_batches for phase, seconds in self.window.items()}
+        utilization = self.worker_utilization(elapsed, busy)
+        self.csv.writerow([self.step, self.epoch, round(rate, 1)] + [round(phase_ms[phase], 3) for phase in PHASES] + [round(utilization, 3)])
+        self.csv_file.flush()
+        if self.writer is not None:
+            self.writer.add_scalar('throughput/samples_per_sec', rate, self.step)
+            self.writer.add_scalar('throughput/worker_utilization', utilization, self.step)
+            for phase in PHASES:
+                self.writer.add_scalar(f'batch_ms/{phase}', phase_ms[phase], self.step)
+        for phase in PHASES:
+            self.totals[phase] += self.window[phase]
+        self.samples += self.window_samples
+        self.total_time += elapsed
+        self.total_busy += busy
+        self._reset_window()
+
+    def summary(self):
+        """Prints the share of each phase over everything logged so far and names the bottleneck."""
+        self.flush()
+        if not self.total_time:
+            return
+        measured = sum(self.totals.values())
+        print(f"{self.samples / self.total_time:.0f} samples/s, DataLoader workers {100 * self.worker_utilization(self.total_time, self.total_busy):.0f}% busy "
+              f"({self.num_workers} workers)")
+        for phase in PHASES:
+            print(f"  {phase:>8}: {1000 * self.totals[phase] / self.step:8.2f} ms/batch ({100 * self.totals[phase] / measured:4.1f}%)")
+        input_share = (self.totals['data'] + self.totals['h2d']) / measured
+        print("  bottleneck: " + ("input pipeline (data loading / copies)" if input_share > 0.5 else "model compute (forward / backward / step)"))
+
+    def close(self):
+        self.summary()
+        self.csv_file.close()
+        if self.writer is not None:
+            self.writer.close()
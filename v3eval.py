@@ -1,19 +1,18 @@
 import pygame
 import os
 import chess
-import chess.syzygy
-import chess.polyglot
 from stockfish import Stockfish
 import random
 import time
+from book import OpeningBook
+from policy_ordering import PolicyOrderer
+from mcts import MCTS
+from engine import MAX, MIN, order_moves, load_engine
 
 # Initialize Stockfish engine using the pip-installed stockfish package
 stockfish = Stockfish()
 stockfish.set_skill_level(4)  # Set the skill level (0 to 20)
 
-# Initialize Syzygy tablebases
-tablebase = chess.syzygy.Tablebase()
-
 # Directory containing the Polyglot books
 polyglot_directory = 'polyglot-collection'
 polyglot_filenames = [
@@ -23,15 +22,14 @@ polyglot_filenames = [
 ]
 polyglot_books = [os.path.join(polyglot_directory, filename) for filename in polyglot_filenames]
 
+# A book compiled with `python book.py` replaces the individual files when present
+compiled_book = 'compiled-book.bin'
+
+# Books are memory-mapped and merged once; missing files are reported here instead of on every move
+opening_book = OpeningBook([compiled_book] if os.path.exists(compiled_book) else polyglot_books)
+
 def get_book_move(board):
-    for book_filename in polyglot_books:
-        try:
-            with chess.polyglot.open_reader(book_filename) as reader:
-                entry = reader.find(board)
-                return entry.move
-        except (KeyError, IndexError):
-            continue
-    return None
+    return opening_book.probe(board)
 
 # Performance metrics
 ai_wins = 0
@@ -46,8 +44,6 @@ initial_elo = 1200
 opponent_elo = 1200  # Assuming Stockfish has a very high rating
 K = 32  # K-factor in Elo rating system
 
-MAX, MIN = 10000, -10000  # Use more realistic values for MAX and MIN
-
 def start_move_timer():
     return time.time()
 
@@ -56,164 +52,27 @@ def stop_move_timer(start_time):
     elapsed_time = end_time - start_time
     move_times.append(elapsed_time)
 
-piece_square_table = {
-    chess.PAWN: [
-        [0,  0,  0,  0,  0,  0,  0,  0],
-        [50, 50, 50, 50, 50, 50, 50, 50],
-        [10, 10, 20, 30, 30, 20, 10, 10],
-        [5,  5, 10, 25, 25, 10,  5,  5],
-        [0,  0,  0, 20, 20,  0,  0,  0],
-        [5, -5,-10,  0,  0,-10, -5,  5],
-        [5, 10, 10,-20,-20, 10, 10,  5],
-        [0,  0,  0,  0,  0,  0,  0,  0]
-    ],
-    chess.KNIGHT: [
-        [-50,-40,-30,-30,-30,-30,-40,-50],
-        [-40,-20,  0,  0,  0,  0,-20,-40],
-        [-30,  0, 10, 15, 15, 10,  0,-30],
-        [-30,  5, 15, 20, 20, 15,  5,-30],
-        [-30,  0, 15, 20, 20, 15,  0,-30],
-        [-30,  5, 10, 15, 15, 10,  5,-30],
-        [-40,-20,  0,  5,  5,  0,-20,-40],
-        [-50,-40,-30,-30,-30,-30,-40,-50]
-    ],
-    chess.BISHOP: [
-        [-20,-10,-10,-10,-10,-10,-10,-20],
-        [-10,  0,  0,  0,  0,  0,  0,-10],
-        [-10,  0,  5, 10, 10,  5,  0,-10],
-        [-10,  5,  5, 10, 10,  5,  5,-10],
-        [-10,  0, 10, 10, 10, 10,  0,-10],
-        [-10, 10, 10, 10, 10, 10, 10,-10],
-        [-10,  5,  0,  0,  0,  0,  5,-10],
-        [-20,-10,-10,-10,-10,-10,-10,-20]
-    ],
-    chess.ROOK: [
-        [0,  0,  0,  0,  0,  0,  0,  0],
-        [5, 10, 10, 10, 10, 10, 10,  5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [0,  0,  0,  5,  5,  0,  0,  0]
-    ],
-    chess.QUEEN: [
-        [-20,-10,-10, -5, -5,-10,-10,-20],
-        [-10,  0,  0,  0,  0,  0,  0,-10],
-        [-10,  0,  5,  5,  5,  5,  0,-10],
-        [-5,  0,  5,  5,  5,  5,  0, -5],
-        [0,  0,  5,  5,  5,  5,  0, -5],
-        [-10,  5,  5,  5,  5,  5,  0,-10],
-        [-10,  0,  5,  0,  0,  0,  0,-10],
-        [-20,-10,-10, -5, -5,-10,-10,-20]
-    ],
-    chess.KING: [
-        [-30,-40,-40,-50,-50,-40,-40,-30],
-        [-30,-40,-40,-50,-50,-40,-40,-30],
-        [-30,-40,-40,-50,-50,-40,-40,-30],
-        [-30,-40,-40,-50,-50,-40,-40,-30],
-        [-20,-30,-30,-40,-40,-30,-30,-20],
-        [-10,-20,-20,-20,-20,-20,-20,-10],
-        [20, 20,  0,  0,  0,  0, 20, 20],
-        [20, 30, 10,  0,  0, 10, 30, 20]
-    ]
+# This evaluation weighs queens and kings more heavily than v3.py
+piece_values = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 5000,
+    chess.KING: 30000
 }
 
-def minimax(depth, maximizingPlayer, alpha, beta, board):
-    if depth == 0 or board.is_game_over():
-        eval_value = evaluate_board(board)
-        return eval_value, None
-
-    best_move = None
-
-    if maximizingPlayer:
-        best = MIN
-        for move in order_moves(board):
-            board.push(move)
-            val, _ = minimax(depth - 1, False, alpha, beta, board)
-            board.pop()
-            if val > best:
-                best = val
-                best_move = move
-            alpha = max(alpha, best)
-            if beta <= alpha:
-                break
-    else:
-        best = MAX
-        for move in order_moves(board):
-            board.push(move)
-            val, _ = minimax(depth - 1, True, alpha, beta, board)
-            board.pop()
-            if val < best:
-                best = val
-                best_move = move
-            beta = min(beta, best)
-            if beta <= alpha:
-                break
-    return best, best_move
-
-def evaluate_board(board):
-    if board.is_checkmate():
-        return MIN if board.turn else MAX
-
-    # Check for endgame using Syzygy tablebases
-    with tablebase:
-        if not (board.has_castling_rights(chess.WHITE) or board.has_castling_rights(chess.BLACK) or board.has_legal_en_passant()):
-            try:
-                wdl = tablebase.probe_wdl(board)
-                if wdl is not None:
-                    print("Syzygy tablebase used for evaluation.")
-                    return wdl * MAX  # Scale the WDL result to a large value
-            except KeyError:
-                pass
-    
-    material = sum(get_piece_value(piece) for piece in board.piece_map().values())
-    positional = sum(piece_square_table[piece.piece_type][square // 8][square % 8] * (1 if piece.color == chess.WHITE else -1) for square, piece in board.piece_map().items())
-    
-    # Add a bonus for pawn advancement in the endgame
-    if len(board.piece_map()) <= 10:  # Endgame condition
-        pawn_bonus = 0
-        for square, piece in board.piece_map().items():
-            if piece.piece_type == chess.PAWN:
-                rank = chess.square_rank(square)
-                if piece.color == chess.WHITE:
-                    pawn_bonus += (rank * 10)  # Reward for advancing pawns
-                else:
-                    pawn_bonus -= ((7 - rank) * 10)
-        return material + positional + pawn_bonus
-    
-    return material + positional
-
-def get_piece_value(piece):
-    values = {
-        chess.PAWN: 100,
-        chess.KNIGHT: 320,
-        chess.BISHOP: 330,
-        chess.ROOK: 500,
-        chess.QUEEN: 5000,
-        chess.KING: 30000
-    }
-    return values[piece.piece_type] if piece.color == chess.WHITE else -values[piece.piece_type]
-
-def order_moves(board):
-    """
-    Order the moves based on their priority: captures, checks, promotions, and then quiet moves.
-    """
-    move_scores = []
-    for move in board.legal_moves:
-        if board.gives_check(move):
-            score = 50  # Arbitrary score for checks
-        elif move.promotion:
-            score = 75  # Arbitrary score for promotions
-        else:
-            score = 10  # Lower score for quiet moves
-        move_scores.append((score, move))
-
-    # Sort moves by their scores in descending order
-    move_scores.sort(reverse=True, key=lambda x: x[0])
-    ordered_moves = [move for score, move in move_scores]
+# Optional CNN move ordering for the first policy_plies plies; export the model with `python cnn_export.py`
+policy_model_path = os.environ.get('CHESSNET_PATH', 'chess_net_cpu.pt')
+policy_plies = 2
+# Top-K pruning of the root and first interior ply (captures, checks and promotions are always searched);
+# e.g. policy_top_k = 8 and/or policy_mass = 0.9. None searches every move.
+policy_top_k = None
+policy_mass = None
+move_orderer = PolicyOrderer(policy_model_path, policy_plies, top_k=policy_top_k, mass=policy_mass)
 
-    return ordered_moves
+# Evaluation and alpha-beta search, shared with v3.py and headless.py; plies without policy ordering use order_moves
+engine = load_engine(piece_values, move_orderer, order_moves)
 
 # Define the Piece class
 class Piece(pygame.sprite.Sprite):
@@ -268,9 +127,15 @@ chess_pieces = Piece(filename, 6, 2)
 DARK_GREEN = (118, 150, 86)
 LIGHT_GREEN = (238, 238, 210)
 
-board = chess.Board()
+board = engine.new_board()
 running = True
 max_depth = 4
+# 'minimax' or 'mcts': PUCT search with the CNN policy as priors (needs the exported model, see policy_model_path)
+search_engine = 'minimax'
+mcts = None
+if search_engine == 'mcts' and move_orderer.model is not None:
+    mcts = MCTS(move_orderer.model, engine.eval_cache.wrap(engine.evaluate_board), simulations=800, batch_size=32,
+                value_fn=engine.value_net.values if engine.value_net is not None else None)
 fps = 60
 clock = pygame.time.Clock()
 
@@ -289,11 +154,21 @@ while running and games_played < max_games:
         start_time = start_move_timer()  # Start timing
         time_limit = 15  # Time limit for AI move calculation
         book_move = get_book_move(board)
+        tablebase_move = None if book_move else (engine.tablebase.probe_root(board) or engine.bitbases.probe_root(board))
         if book_move:
             board.push(book_move)
             print(f"Black (book) {book_move.uci()}")
+        elif tablebase_move:
+            board.push(tablebase_move)
+            print(f"Black (tablebase) {tablebase_move.uci()}")
         else:
-            _, ai_move = minimax(max_depth, False, MIN, MAX, board)
+            if mcts is not None:
+                ai_move = mcts.choose_move(board)
+                print(mcts)
+                mcts.reset_stats()
+            else:
+                _, ai_move = engine.minimax(max_depth, False, MIN, MAX, board)
+                engine.print_search_stats()
             if ai_move:
                 board.push(ai_move)
                 print(f"Black {ai_move.uci()}")
@@ -333,10 +208,12 @@ while running and games_played < max_games:
         print(f"Current Elo after game {games_played}: {initial_elo}")
 
         board.reset()
+        opening_book.new_game()
 
     clock.tick(fps)
 
 pygame.quit()
+engine.tablebase.close()
 
 # Print performance metrics
 print(f"Games played: {games_played}")
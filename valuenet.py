@@ -0,0 +1,261 @@
+"""
+A small value network for fast CPU leaf evaluation, distilled from game outcomes and/or the engine's own
+quiescence-searched evaluation.
+
+The network is an MLP over 768 piece-square features plus a side-to-move bit: 769 -> 128 -> 32 -> 1 (tanh),
+giving White's expected result in [-1, 1]. A position has at most 32 active features, so the NumPy forward
+pass sums 32 rows of the first layer instead of doing a dense matrix product; with feature extraction that
+is about 20 us per board, around a quarter of the cost of the piece-square-table evaluation.
+
+    python valuenet.py build chess_games.csv -o value-data.npz --max-games 100000 --target engine
+    python valuenet.py train value-data.npz -o value_net.npz --mix 0.5
+    python valuenet.py bench value_net.npz
+"""
+import os
+import math
+import time
+import argparse
+import multiprocessing
+import numpy as np
+import chess
+from board_rep import PIECE_ORDER, board_bitboards
+from packed import encode_many, square_codes, white_to_move
+
+FEATURES = 12 * 64 + 1
+
+# Nibble code of packed.py -> feature plane, in board_bitboards order (white p, r, n, b, q, k, then black); -1 is empty
+_FEATURE_PLANE = np.full(16, -1, dtype=np.int64)
+for _plane, _piece_type in enumerate(PIECE_ORDER):
+    _FEATURE_PLANE[_piece_type] = _plane
+    _FEATURE_PLANE[8 | _piece_type] = 6 + _plane
+
+def packed_features(records):
+    """(N, 34) packed records -> (N, 769) float32 features: plane * 64 + square, then White to move."""
+    codes = square_codes(records)
+    planes = _FEATURE_PLANE[codes]
+    features = np.zeros((len(codes), FEATURES), dtype=np.float32)
+    rows, squares = np.nonzero(planes >= 0)
+    features[rows, planes[rows, squares] * 64 + squares] = 1
+    features[:, -1] = white_to_move(records)
+    return features
+
+def board_features(board):
+    """Indices of the active features of one board, matching packed_features."""
+    bitboards = board_bitboards(board).astype('<u8')
+    active = np.flatnonzero(np.unpackbits(bitboards.view(np.uint8), bitorder='little'))
+    if board.turn == chess.WHITE:
+        active = np.append(active, FEATURES - 1)
+    return active
+
+def value_samples(games, target='outcome', quiescence_depth=4, stride=1, value_scale=400):
+    """
+    Worker: replays (AN, Result) pairs; returns packed positions, the game outcome for White (+1 / 0 / -1) and,
+    for target='engine', the quiescence-searched evaluation of each position squashed to [-1, 1] for White.
+    The evaluation is the engine's own hand-written one (engine.reference_engine), never a trained network.
+    """
+    from engine import reference_engine
+    from mcts import quiescence
+    from gamebook import RESULTS, create_move_list
+    records, outcomes, evals = [], [], []
+    for an, result in games:
+        points = RESULTS.get(result)
+        if points is None:
+            continue
+        board = chess.Board()
+        boards = []
+        try:
+            for ply, san in enumerate(create_move_list(an)):
+                if ply % stride == 0:
+                    boards.append(board.copy(stack=False))
+                board.push_san(san)
+        except ValueError:
+            pass  # Keep the positions before an unparsable move
+        if not boards:
+            continue
+        records.append(encode_many(boards))
+        outcomes.append(np.full(len(boards), points[0] - points[1], dtype=np.int8))
+        if target == 'engine':
+            for position in boards:
+                score = quiescence(position, -math.inf, math.inf, reference_engine().evaluate_board, quiescence_depth)
+                score = score if position.turn == chess.WHITE else -score
+                evals.append(math.tanh(score / value_scale))
+    if not records:
+        return np.zeros((0, 34), dtype=np.uint8), np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.float32)
+    return np.concatenate(records), np.concatenate(outcomes), np.array(evals, dtype=np.float32)
+
+def _value_batch(args):
+    return value_samples(*args)
+
+def build_value_data(csv_path, output, target='outcome', min_elo=1600, max_games=None, stride=1,
+                     processes=None, chunk_size=20000):
+    from gamebook import _read_games  # pandas is only needed to build data, not to run the engines
+    parts, games = [], 0
+    with multiprocessing.Pool(processes) as pool:
+        for chunk in _read_games(csv_path, chunk_size, min_elo, max_games):
+            step = max(1, len(chunk) // (4 * (processes or os.cpu_count() or 1)))
+            batches = [(chunk[i:i + step], target, 4, stride) for i in range(0, len(chunk), step)]
+            parts.extend(pool.imap(_value_batch, batches))
+            games += len(chunk)
+            print(f"{games} games, {sum(len(part[0]) for part in parts)} positions")
+    positions, outcomes, evals = (np.concatenate(column) for column in zip(*parts))
+    arrays = {'positions': positions, 'outcomes': outcomes}
+    if target == 'engine':
+        arrays['evals'] = evals
+    np.savez(output, **arrays)
+    print(f"Wrote {len(positions)} positions from {games} games to {output}")
+    return len(positions)
+
+def train_value_net(data_path, output, hidden=128, hidden2=32, epochs=4, batch_size=1024, lr=1e-3, mix=0.5,
+                    val_fraction=0.05, seed=0, device='cpu'):
+    """
+    Trains on value-data.npz and writes the weights for NumpyValueNet to `output`.
+    mix weights the game outcome against the engine evaluation in the target (1.0 = outcome only); without
+    engine evaluations in the data the outcome is used alone.
+    """
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    class ValueNet(nn.Module):
+        def __init__(self):
+            super(ValueNet, self).__init__()
+            self.fc1 = nn.Linear(FEATURES, hidden)
+            self.fc2 = nn.Linear(hidden, hidden2)
+            self.out = nn.Linear(hidden2, 1)
+
+        def forward(self, x):
+            return torch.tanh(self.out(F.relu(self.fc2(F.relu(self.fc1(x)))))).squeeze(-1)
+
+    data = np.load(data_path)
+    positions = data['positions']
+    targets = data['outcomes'].astype(np.float32)
+    if 'evals' in data.files:
+        targets = mix * targets + (1 - mix) * data['evals']
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(positions))
+    val_count = int(len(order) * val_fraction)
+    val_index, train_index = order[:val_count], order[val_count:]
+
+    torch.manual_seed(seed)
+    model = ValueNet().to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+
+    def batches(index):
+        for start in range(0, len(index), batch_size):
+            part = np.sort(index[start:start + batch_size])
+            x = torch.from_numpy(packed_features(positions[part])).to(device)
+            y = torch.from_numpy(targets[part]).to(device)
+            yield x, y
+
+    for epoch in range(epochs):
+        model.train()
+        rng.shuffle(train_index)
+        total, count = 0.0, 0
+        for x, y in batches(train_index):
+            optimizer.zero_grad()
+            loss = F.mse_loss(model(x), y)
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(y)
+            count += len(y)
+        model.eval()
+        val_total = 0.0
+        with torch.no_grad():
+            for x, y in batches(val_index):
+                val_total += F.mse_loss(model(x), y, reduction='sum').item()
+        print(f"Epoch {epoch + 1}/{epochs}, train MSE {total / max(count, 1):.4f}, val MSE {val_total / max(val_count, 1):.4f}")
+
+    weights = {name: tensor.detach().cpu().numpy() for name, tensor in model.state_dict().items()}
+    np.savez(output, w1=weights['fc1.weight'].T.copy(), b1=weights['fc1.bias'], w2=weights['fc2.weight'].T.copy(),
+             b2=weights['fc2.bias'], w3=weights['out.weight'][0], b3=weights['out.bias'])
+    print(f"Saved {output}")
+    return model
+
+class NumpyValueNet:
+    """NumPy inference for the trained value network; evaluate() is a drop-in for evaluate_board's static part."""
+    def __init__(self, path, value_scale=400):
+        weights = np.load(path)
+        self.w1 = weights['w1'].astype(np.float32)
+        self.b1 = weights['b1'].astype(np.float32)
+        self.w2 = weights['w2'].astype(np.float32)
+        self.b2 = weights['b2'].astype(np.float32)
+        self.w3 = weights['w3'].astype(np.float32)
+        self.b3 = float(weights['b3'][0])
+        self.value_scale = value_scale
+
+    def value(self, board):
+        """Expected result for White in [-1, 1]."""
+        hidden = np.maximum(self.b1 + self.w1[board_features(board)].sum(axis=0), 0)
+        hidden = np.maximum(hidden @ self.w2 + self.b2, 0)
+        return math.tanh(float(hidden @ self.w3) + self.b3)
+
+    def evaluate(self, board):
+        """Centipawn-like score from White's point of view, on the scale of evaluate_board."""
+        value = min(max(self.value(board), -0.999), 0.999)
+        return self.value_scale * math.atanh(value)
+
+    def _dense(self, features):
+        hidden = np.maximum(features @ self.w1 + self.b1, 0)
+        hidden = np.maximum(hidden @ self.w2 + self.b2, 0)
+        return np.tanh(hidden @ self.w3 + self.b3)
+
+    def values(self, boards):
+        """Batched values for the side to move, e.g. MCTS(value_fn=...)."""
+        values = self._dense(packed_features(encode_many(boards)))
+        return np.where([board.turn == chess.WHITE for board in boards], values, -values)
+
+    def evaluate_bitboards(self, bitboards, white_to_move):
+        """Batched evaluate(): (N, 12) board_bitboards plus side-to-move flags -> scores from White's point of view."""
+        bitboards = np.ascontiguousarray(bitboards, dtype='<u8')
+        bits = np.unpackbits(bitboards.view(np.uint8), axis=-1, bitorder='little').reshape(len(bitboards), -1)
+        features = np.concatenate([bits, np.asarray(white_to_move, dtype=np.uint8)[:, None]], axis=1).astype(np.float32)
+        values = np.clip(self._dense(features), -0.999, 0.999)
+        return self.value_scale * np.arctanh(values)
+
+def benchmark(net, boards, batch_size=32):
+    """Microseconds per position: value net (one board and batched) against the PST evaluation."""
+    from engine import reference_engine
+    results = {}
+    for name, function in (('pst', reference_engine().evaluate_board), ('value net', net.evaluate)):
+        start = time.perf_counter()
+        for board in boards:
+            function(board)
+        results[name] = 1e6 * (time.perf_counter() - start) / len(boards)
+    start = time.perf_counter()
+    for i in range(0, len(boards), batch_size):
+        net.values(boards[i:i + batch_size])
+    results[f'value net x{batch_size}'] = 1e6 * (time.perf_counter() - start) / len(boards)
+    for name, micros in results.items():
+        print(f"{name:>16}: {micros:.1f} us/position")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build data for, train and benchmark the value network.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="replay chess_games.csv into value-data.npz")
+    build.add_argument('csv', nargs='?', default='chess_games.csv')
+    build.add_argument('-o', '--output', default='value-data.npz')
+    build.add_argument('--target', choices=['outcome', 'engine'], default='outcome', help="'engine' also stores quiescence evals")
+    build.add_argument('--min-elo', type=int, default=1600)
+    build.add_argument('--max-games', type=int, default=None)
+    build.add_argument('--stride', type=int, default=1, help="keep every stride-th position of a game")
+    build.add_argument('--processes', type=int, default=None)
+    train = commands.add_parser('train', help="train and export value_net.npz")
+    train.add_argument('data', nargs='?', default='value-data.npz')
+    train.add_argument('-o', '--output', default='value_net.npz')
+    train.add_argument('--epochs', type=int, default=4)
+    train.add_argument('--batch-size', type=int, default=1024)
+    train.add_argument('--lr', type=float, default=1e-3)
+    train.add_argument('--mix', type=float, default=0.5, help="weight of the game outcome against the engine eval")
+    bench = commands.add_parser('bench', help="compare the cost of the value net and the PST evaluation")
+    bench.add_argument('weights', nargs='?', default='value_net.npz')
+    bench.add_argument('--positions', type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_value_data(args.csv, args.output, args.target, args.min_elo, args.max_games, args.stride, args.processes)
+    elif args.command == 'train':
+        train_value_net(args.data, args.output, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr, mix=args.mix)
+    else:
+        from cnn_export import random_positions
+        benchmark(NumpyValueNet(args.weights), random_positions(args.positions, seed=1))